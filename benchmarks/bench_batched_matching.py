@@ -0,0 +1,85 @@
+# benchmarks/bench_batched_matching.py
+"""
+同尺寸模板批量匹配的耗时随组大小的变化。
+
+对比两种方式在同一幅合成画面上匹配 N 个同尺寸模板的单帧耗时：
+  * baseline: 每个模板单独调用 cv2.matchTemplate(TM_CCOEFF_NORMED)
+  * batched:  FrameMatcher（N >= 2 时共享积分图、窗口方差和画面分块的正向 DFT，逐个模板只做频谱相乘和逆 DFT）
+
+用法: python benchmarks/bench_batched_matching.py [--width 1920 --height 1080 --frames 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_matcher import FrameMatcher
+
+
+def make_frame(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+    return cv2.GaussianBlur(frame, (5, 5), 0)
+
+
+def make_templates(gray, count, tw, th, seed=1):
+    rng = np.random.default_rng(seed)
+    height, width = gray.shape
+    templates = []
+    for _ in range(count):
+        x = int(rng.integers(0, width - tw))
+        y = int(rng.integers(0, height - th))
+        templates.append(gray[y:y + th, x:x + tw].copy())
+    return templates
+
+
+def time_baseline(frame, templates, frames):
+    start = time.perf_counter()
+    for _ in range(frames):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGRA2GRAY)
+        for template in templates:
+            cv2.matchTemplate(gray, template, cv2.TM_CCOEFF_NORMED)
+    return (time.perf_counter() - start) / frames
+
+
+def time_batched(frame, templates, frames, threshold):
+    matcher = FrameMatcher(templates, threshold)
+    matcher.load_frame(frame)  # 预热：分配缓冲区
+    start = time.perf_counter()
+    for _ in range(frames):
+        matcher.load_frame(frame)
+        for index in range(len(templates)):
+            matcher.match_template(index)
+    return (time.perf_counter() - start) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--template-width', type=int, default=50)
+    parser.add_argument('--template-height', type=int, default=70)
+    parser.add_argument('--frames', type=int, default=5)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    frame = make_frame(args.width, args.height)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGRA2GRAY)
+    print(f"画面 {args.width}x{args.height}，模板 {args.template_width}x{args.template_height}，"
+          f"OpenCV {cv2.__version__}，线程数 {cv2.getNumThreads()}")
+    print(f"{'组大小':>6} {'baseline ms':>12} {'batched ms':>11} {'每模板 ms':>10} {'加速比':>7}")
+    for size in args.sizes:
+        templates = make_templates(gray, size, args.template_width, args.template_height)
+        baseline = time_baseline(frame, templates, args.frames)
+        batched = time_batched(frame, templates, args.frames, 0.9)
+        print(f"{size:>6} {baseline * 1000:>12.1f} {batched * 1000:>11.1f} "
+              f"{batched * 1000 / size:>10.2f} {baseline / batched:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+# benchmarks/bench_steady_state_allocations.py
+"""
+检测管线稳态下的内存分配检查。
+
+在一幅合成画面上构建 MonitoredWindow（包含单独的模板、同尺寸的模板组以及会触发
+细化的相似图片簇），每帧完整执行 capture() -> 匹配 -> 细化 -> update_stable_rects()，
+预热若干帧让所有缓冲区分配完毕，然后在 tracemalloc 下再运行 N 帧：
+  * 常驻内存 / 内存块数在 N 帧前后的增长不得超过容差（没有逐帧累积的分配）
+  * 单帧内的临时内存峰值不得超过容差（没有逐帧新建画面大小的数组）
+任一项超出时以非零状态退出。每个金字塔层级分别检查一次。
+
+截图分别使用两种截图器：
+  * gdi: 与 GdiGrabber 相同，每帧写入常驻缓冲区（这里用复制合成画面代替 BitBlt），三项都检查
+  * mss: 真正的 MssGrabber，配合每次返回新 bytearray 的假 mss（与 mss 的行为一致）。
+         这一次画面大小的分配是已知的，只检查增长，不检查单帧峰值
+
+用法: python benchmarks/bench_steady_state_allocations.py [--frames 50 --levels 0 1]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+import types
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from detection_thread import MonitoredWindow
+from screen_grabber import MssGrabber
+
+
+def make_frame(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+    return cv2.GaussianBlur(frame, (5, 5), 0)
+
+
+def make_templates(gray, tw, th, seed=1):
+    """两张不同尺寸的单独模板、一组同尺寸模板，以及一簇在画面上出现过的相似图片。"""
+    rng = np.random.default_rng(seed)
+    height, width = gray.shape
+
+    def crop(w, h):
+        x = int(rng.integers(0, width - w))
+        y = int(rng.integers(0, height - h))
+        return gray[y:y + h, x:x + w].copy()
+
+    templates = [crop(tw + 10, th + 10), crop(tw - 10, th - 10)]
+    templates += [crop(tw, th) for _ in range(4)]
+    # 同一张图片的多个轻微变体，会被索引聚成一簇，代表图命中后在局部细化
+    base = crop(tw, th)
+    for _ in range(6):
+        noise = rng.integers(-6, 7, base.shape)
+        templates.append(np.clip(base.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    return templates
+
+
+class StubGdiGrabber:
+    """与 GdiGrabber 行为一致：每种尺寸一块常驻缓冲区，每帧把画面写入其中。"""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.buffer = np.empty_like(frame)
+
+    def grab(self, region):
+        np.copyto(self.buffer, self.frame)
+        return self.buffer
+
+
+class FakeMss:
+    """与 mss 行为一致：每次截图都返回一块新的 bytearray。"""
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def grab(self, region):
+        height, width = self.frame.shape[:2]
+        return types.SimpleNamespace(raw=bytearray(self.frame.data), width=width, height=height)
+
+
+class FrameClock:
+    """每帧前进 1/30 秒的时钟，驱动红框的出现 / 消失计时。"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def tick(self):
+        self.now += 1.0 / 30
+        return self.now
+
+
+def run_frame(window, grabber, clock):
+    """执行一帧完整的检测（与检测线程的顺序一致，但在当前线程中串行执行）。"""
+    window.capture(grabber)
+    for entry_index in range(len(window.entries)):
+        window.matcher.match_template(entry_index)
+    for entry_index in window.cluster_entries:
+        window.refine_entry(entry_index)
+    window.update_stable_rects(clock.tick())
+    return window.current_confirmed_rects
+
+
+def traced_blocks(snapshot):
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    return sum(stat.count for stat in snapshot.statistics('filename'))
+
+
+def measure(window, grabber, clock, level, warmup, frames):
+    """
+    :return: (常驻内存增长字节数, 内存块数增长, 单帧临时内存峰值字节数, 本层级显示的红框数)
+    """
+    window.matcher.set_level(level)
+    for _ in range(warmup):
+        rects = run_frame(window, grabber, clock)
+    del rects
+    gc.collect()
+
+    tracemalloc.start()
+    # 先在追踪状态下运行一帧并取一次快照，排除 tracemalloc 自身和解释器缓存的一次性开销
+    run_frame(window, grabber, clock)
+    traced_blocks(tracemalloc.take_snapshot())
+    gc.collect()
+    start_current, _ = tracemalloc.get_traced_memory()
+    start_blocks = traced_blocks(tracemalloc.take_snapshot())
+
+    transient_peak = 0
+    for _ in range(frames):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        rects = run_frame(window, grabber, clock)
+        _, peak = tracemalloc.get_traced_memory()
+        transient_peak = max(transient_peak, peak - before)
+    box_count = len(rects)
+    del rects
+    gc.collect()
+
+    end_current, _ = tracemalloc.get_traced_memory()
+    end_blocks = traced_blocks(tracemalloc.take_snapshot())
+    tracemalloc.stop()
+    return end_current - start_current, end_blocks - start_blocks, transient_peak, box_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--template-width', type=int, default=50)
+    parser.add_argument('--template-height', type=int, default=70)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--levels', type=int, nargs='+', default=[0, 1])
+    parser.add_argument('--max-growth-kib', type=float, default=1.0,
+                        help='N 帧前后常驻内存允许的增长')
+    parser.add_argument('--max-blocks', type=int, default=8,
+                        help='N 帧前后内存块数允许的增长')
+    # numpy 对非连续视图做逐元素运算时会临时申请固定大小的迭代缓冲区（约 120 KiB，与画面尺寸无关），
+    # 上限只需远小于一幅灰度画面即可发现逐帧新建的画面大小数组
+    parser.add_argument('--max-transient-kib', type=float, default=256.0,
+                        help='单帧临时内存峰值的上限')
+    args = parser.parse_args()
+
+    frame = make_frame(args.width, args.height)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGRA2GRAY)
+    templates = make_templates(gray, args.template_width, args.template_height)
+    region = {'left': 0, 'top': 0, 'width': args.width, 'height': args.height}
+    print(f"画面 {args.width}x{args.height}（BGRA {frame.nbytes / 1024:.0f} KiB，灰度 {gray.nbytes / 1024:.0f} KiB），"
+          f"{len(templates)} 张图片，每层级 {args.frames} 帧")
+    print(f"{'截图器':>6} {'层级':>4} {'红框':>4} {'常驻增长 KiB':>12} {'内存块增长':>10} {'单帧峰值 KiB':>12}")
+
+    failures = []
+    grabbers = [('gdi', StubGdiGrabber(frame), True), ('mss', MssGrabber(FakeMss(frame)), False)]
+    for name, grabber, check_transient in grabbers:
+        window = MonitoredWindow(
+            window_rect=region, targets_cv=templates, confidence=80,
+            box_dims={'width': args.template_width, 'height': args.template_height}, delay=1.0
+        )
+        clock = FrameClock()
+        for level in args.levels:
+            growth, blocks, transient, box_count = measure(window, grabber, clock, level, args.warmup, args.frames)
+            print(f"{name:>6} {level:>4} {box_count:>4} {growth / 1024:>12.2f} {blocks:>10} {transient / 1024:>12.2f}")
+            if growth > args.max_growth_kib * 1024:
+                failures.append(f"{name} 层级 {level}: 常驻内存增长 {growth / 1024:.2f} KiB")
+            if blocks > args.max_blocks:
+                failures.append(f"{name} 层级 {level}: 内存块数增长 {blocks}")
+            if check_transient and transient > args.max_transient_kib * 1024:
+                failures.append(f"{name} 层级 {level}: 单帧临时内存峰值 {transient / 1024:.2f} KiB")
+
+    if failures:
+        sys.exit("稳态分配检查失败:\n  " + "\n  ".join(failures))
+    print("稳态分配检查通过")
+
+
+if __name__ == '__main__':
+    main()
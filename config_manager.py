@@ -8,14 +8,30 @@ class ConfigManager:
     
     CONFIG_FILE = "config.json"
     
-    DEFAULT_CONFIG = {
+    # 每个被监测窗口各自的配置
+    DEFAULT_MONITOR = {
+        "window_title": None,
         "target_images": [],
         "confidence": 80,
         "box_width": 50,
         "box_height": 70,
-        "disappear_delay": 2.0,
+        "disappear_delay": 2.0
+    }
+
+    DEFAULT_CONFIG = {
+        "monitors": [],
         "hotkey": "f9",
-        "window_title": None
+        "snapshot_hotkey": "f10",
+        # 自适应调节：目标单帧延迟（毫秒，0 表示关闭，默认关闭）和CPU预算（占整机的百分比）
+        "target_latency_ms": 0,
+        "cpu_budget": 50,
+        # 自适应调节的参数范围（max_workers 为 0 表示 CPU 核数 - 1）
+        "min_fps": 2,
+        "max_fps": 30,
+        "max_workers": 0,
+        "max_pyramid_level": 1,
+        # 每张图片每帧最多显示的检测框数量，超出的部分会被丢弃并在日志中警告
+        "max_matches_per_template": 32
     }
 
     def __init__(self):
@@ -30,12 +46,34 @@ class ConfigManager:
                     # 确保所有默认键都存在
                     for key, value in self.DEFAULT_CONFIG.items():
                         config.setdefault(key, value)
+                    self._migrate_monitors(config)
                     return config
             except (json.JSONDecodeError, TypeError):
                 print(f"配置文件 '{self.CONFIG_FILE}' 格式错误, 将使用默认配置。")
-                return self.DEFAULT_CONFIG.copy()
-        else:
-            return self.DEFAULT_CONFIG.copy()
+        return self._default_config()
+
+    def _default_config(self):
+        """生成一份包含单个默认监测窗口的配置。"""
+        config = self.DEFAULT_CONFIG.copy()
+        config["monitors"] = [self._new_monitor()]
+        return config
+
+    def _new_monitor(self):
+        """生成一份默认的窗口配置（列表字段单独复制，避免共享引用）。"""
+        monitor = self.DEFAULT_MONITOR.copy()
+        monitor["target_images"] = []
+        return monitor
+
+    def _migrate_monitors(self, config):
+        """将旧版本的单窗口顶层配置迁移到 monitors 列表，并补全每个窗口的默认键。"""
+        legacy = {key: config.pop(key) for key in self.DEFAULT_MONITOR if key in config}
+        if not config["monitors"]:
+            monitor = self._new_monitor()
+            monitor.update(legacy)
+            config["monitors"] = [monitor]
+        for monitor in config["monitors"]:
+            for key, value in self._new_monitor().items():
+                monitor.setdefault(key, value)
 
     def save_config(self):
         """将当前配置保存到 JSON 文件。"""
@@ -54,14 +92,36 @@ class ConfigManager:
         self.config[key] = value
         self.save_config()
 
-    def add_target_image(self, path):
-        """添加一个目标图片路径到列表（如果不存在）。"""
-        if path not in self.config["target_images"]:
-            self.config["target_images"].append(path)
+    def get_monitor(self, index):
+        """获取指定窗口的配置字典。"""
+        return self.config["monitors"][index]
+
+    def add_monitor(self):
+        """新增一个默认配置的监测窗口，返回其索引。"""
+        self.config["monitors"].append(self._new_monitor())
+        self.save_config()
+        return len(self.config["monitors"]) - 1
+
+    def remove_monitor(self, index):
+        """移除指定的监测窗口。"""
+        del self.config["monitors"][index]
+        self.save_config()
+
+    def update_monitor(self, index, **values):
+        """批量更新指定窗口的配置并保存。"""
+        self.config["monitors"][index].update(values)
+        self.save_config()
+
+    def add_target_image(self, index, path):
+        """添加一个目标图片路径到指定窗口的列表（如果不存在）。"""
+        images = self.config["monitors"][index]["target_images"]
+        if path not in images:
+            images.append(path)
             self.save_config()
 
-    def remove_target_image(self, path):
-        """从列表中移除一个目标图片路径。"""
-        if path in self.config["target_images"]:
-            self.config["target_images"].remove(path)
+    def remove_target_image(self, index, path):
+        """从指定窗口的列表中移除一个目标图片路径。"""
+        images = self.config["monitors"][index]["target_images"]
+        if path in images:
+            images.remove(path)
             self.save_config()
\ No newline at end of file
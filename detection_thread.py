@@ -1,219 +1,569 @@
 # detection_thread.py
 
 import cv2
+import logging
 import numpy as np
-import mss
 import time
+import threading
+import queue
+from collections import deque
 from PyQt6.QtCore import QThread, pyqtSignal, QRect
 import multiprocessing
+from multiprocessing.pool import ThreadPool
 
-# --- Helper function for multiprocessing ---
-def match_template_worker(args):
-    """
-    在独立进程中执行单个模板匹配。
-    :param args: 包含 (主图像, 模板, 阈值, 模板索引) 的元组
-    :return: 包含 (模板索引, 匹配结果矩形列表) 的元组
-    """
-    img_gray, template, threshold, template_index = args
+from frame_matcher import FrameMatcher
+from screen_grabber import create_grabber
+from template_index import TemplateIndex
+
+logger = logging.getLogger(__name__)
+
+class MonitoredWindow:
+    """单个被监测窗口的状态：截图区域、模板匹配缓冲区以及红框的稳定性跟踪。"""
+
+    # 在代表图命中位置附近搜索簇内成员时，向四周扩展的最小像素数
+    REFINE_RADIUS = 4
+    # 跟踪红框时使用的网格大小（像素），落在同一网格的检测框视为同一个目标（容忍小范围移动）
+    GRID_SIZE = 20
+
+    def __init__(self, window_rect, targets_cv, confidence, box_dims, delay, index=None,
+                 capacity=FrameMatcher.DEFAULT_CAPACITY):
+        """
+        :param index: 目标图片的 TemplateIndex；为 None 时根据 targets_cv 现场构建
+        :param capacity: 每张图片每帧最多保留的检测框数量
+        """
+        self.window_rect = window_rect
+        self.targets_cv = targets_cv
+        self.confidence_threshold = confidence / 100.0
+        self.box_dims = box_dims
+        self.disappear_delay = delay
+
+        # 整幅画面上只匹配索引的顶层节点：叶子使用目标阈值，簇的代表图使用按簇内分散程度放宽后的阈值
+        self.index = index if index is not None else TemplateIndex.build(targets_cv)
+        self.entries = self.index.root_nodes()
+        thresholds = [TemplateIndex.relaxed_threshold(node, self.confidence_threshold) for node in self.entries]
+        self.matcher = FrameMatcher([node.template for node in self.entries], thresholds, capacity)
+        # 顶层簇中细化确认的检测框，与 matcher 的输出一样使用固定容量数组
+        self.cluster_entries = [i for i, node in enumerate(self.entries) if not node.is_leaf]
+        self.refined_boxes = np.zeros((len(self.entries), self.matcher.capacity, 4), dtype=np.int32)
+        self.refined_counts = np.zeros(len(self.entries), dtype=np.int32)
+        self._roi_results = {}  # {(簇节点 id, 结果尺寸): 局部匹配的结果缓冲区}
+        self.overflow_reported = False  # 检测框超出容量上限的警告只记录一次
+        # 稳定性控制：需要连续N帧确认才显示/消失
+        self.appear_frames = 1  # 1帧检测到就立即显示
+        self.disappear_frames = 2  # 连续2帧未检测到才消失
+
+        # 本帧检测框的汇总缓冲区：每项最多 capacity 个，换算为红框左上角并按网格生成跟踪键
+        capacity = self.matcher.capacity
+        count = len(self.entries)
+        self._is_cluster = np.zeros((count, 1, 1), dtype=bool)
+        self._is_cluster[self.cluster_entries] = True
+        self._slots = np.arange(capacity, dtype=np.int32)[None, :]
+        self._all_boxes = np.zeros((count, capacity, 4), dtype=np.int32)
+        self._all_counts = np.zeros(count, dtype=np.int32)
+        self._valid = np.zeros((count, capacity), dtype=bool)
+        self._found = np.zeros((count * capacity, 4), dtype=np.int32)
+        self._found_keys = np.zeros(count * capacity, dtype=np.int64)
+        self._key_y = np.zeros(count * capacity, dtype=np.int64)
+        self.found_count = 0
+
+        # 红框跟踪状态，按槽位存放在固定容量的数组中（槽位不够时加倍扩容）
+        self._allocate_tracks(max(64, 2 * count * capacity))
+        self._shown = np.zeros((0, 2), dtype=np.int32)  # 当前显示的红框左上角，用于判断是否变化
+        self.current_confirmed_rects = []  # 当前已确认显示的 QRect 列表，仅在变化时重建
+
+    def capture(self, grabber):
+        """
+        截取窗口图像并载入匹配缓冲区。
+        Windows 上截图直接写入截图器常驻的缓冲区；其他平台的 mss 每帧仍会新建一块画面大小的 bytearray。
+        """
+        self.matcher.load_frame(grabber.grab(self.window_rect))
+
+    def _allocate_tracks(self, size):
+        """分配（或扩容）红框跟踪数组，保留已有的跟踪状态。"""
+        old = getattr(self, '_track_active', None)
+        tracks = {
+            '_track_active': np.zeros(size, dtype=bool),
+            '_track_keys': np.zeros(size, dtype=np.int64),
+            '_track_pos': np.zeros((size, 2), dtype=np.int32),  # 红框左上角 (x, y)
+            '_track_appear': np.zeros(size, dtype=np.int32),
+            '_track_disappear': np.zeros(size, dtype=np.int32),
+            '_track_confirmed': np.zeros(size, dtype=bool),
+            '_track_time': np.zeros(size, dtype=np.float64),
+        }
+        for name, array in tracks.items():
+            if old is not None:
+                previous = getattr(self, name)
+                array[:len(previous)] = previous
+            setattr(self, name, array)
+
+    def refine_entry(self, entry_index):
+        """
+        对整幅画面匹配中命中的簇，在命中位置附近逐层匹配簇内成员，直到叶子。
+        每个命中位置只保留得分最高的一张图片的检测框：簇内图片彼此相似，
+        往往有许多张同时超过阈值，逐张记录会占满容量而挤掉其他位置的命中。
+        每个顶层簇使用各自的结果缓冲区和输出行，因此不同簇可以在线程池中并行细化。
+        """
+        self.refined_counts[entry_index] = 0
+        matcher = self.matcher
+        # 金字塔层级越高，代表图命中位置的误差越大
+        radius = self.REFINE_RADIUS + 2 ** matcher.level
+        boxes = matcher.boxes[entry_index]
+        for i in range(matcher.counts[entry_index]):
+            x, y, _, _ = boxes[i].tolist()
+            score, box = self._descend(self.entries[entry_index], x, y, radius)
+            if box is None:
+                continue
+            # 命中数不超过 matcher 的容量，因此这里不会溢出
+            count = self.refined_counts[entry_index]
+            self.refined_boxes[entry_index, count] = box
+            self.refined_counts[entry_index] = count + 1
+
+    def _roi_result(self, node, shape):
+        """获取 node 的子节点在局部区域内匹配时使用的结果缓冲区（同一簇的子节点尺寸相同，共用一个）。"""
+        key = (id(node), shape)
+        buffer = self._roi_results.get(key)
+        if buffer is None:
+            buffer = np.empty(shape, dtype=np.float32)
+            self._roi_results[key] = buffer
+        return buffer
+
+    def _descend(self, node, x, y, radius):
+        """
+        在 (x, y) 附近的小区域内匹配 node 的子节点。
+        :return: (最高得分, 检测框 (x, y, 宽, 高))，没有叶子达到目标阈值时检测框为 None
+        """
+        gray = self.matcher.gray
+        height, width = gray.shape
+        th, tw = node.template.shape
+        # 区域大小固定（靠近画面边缘时平移而不是裁剪），使结果缓冲区尺寸不变，可以逐帧复用
+        roi_h, roi_w = min(th + 2 * radius, height), min(tw + 2 * radius, width)
+        y0 = min(max(0, y - radius), height - roi_h)
+        x0 = min(max(0, x - radius), width - roi_w)
+        roi = gray[y0:y0 + roi_h, x0:x0 + roi_w]
+        res = self._roi_result(node, (roi_h - th + 1, roi_w - tw + 1))
 
-    # 如果 template 为 None，返回占位的尺寸 0,0，保持返回值数量一致
-    if template is None:
-        return template_index, [], 0, 0
+        best_score, best_box = -1.0, None
+        for child in node.children:
+            cv2.matchTemplate(roi, child.template, cv2.TM_CCOEFF_NORMED, result=res)
+            _, max_val, _, (dx, dy) = cv2.minMaxLoc(res)
+            if child.is_leaf:
+                if max_val >= self.confidence_threshold and max_val > best_score:
+                    best_score, best_box = max_val, (x0 + dx, y0 + dy, tw, th)
+            elif max_val >= TemplateIndex.relaxed_threshold(child, self.confidence_threshold):
+                score, box = self._descend(child, x0 + dx, y0 + dy, radius)
+                if box is not None and score > best_score:
+                    best_score, best_box = score, box
+        return best_score, best_box
 
-    # 模板宽高
-    w, h = template.shape[::-1]
+    def report_overflow(self):
+        """本帧有检测框因容量上限被丢弃时记录警告（每个窗口只记录一次，避免刷屏）。"""
+        if self.overflow_reported or not self.matcher.overflowed.any():
+            return
+        self.overflow_reported = True
+        logger.warning(
+            "截图区域 %s 中有图片在一帧内的检测框超过上限 %d 个，多出的检测框已被丢弃；"
+            "如需显示全部，请调大配置项 max_matches_per_template 或提高相似度阈值",
+            self.window_rect, self.matcher.capacity
+        )
+
+    def collect_boxes(self):
+        """
+        将本帧检测框汇总到预分配的数组中（叶子取整幅画面的匹配结果，簇取细化后的结果），
+        并按红框尺寸居中换算为左上角坐标、按网格生成跟踪键。全程不创建逐个检测框的 Python 对象。
+        :return: 本帧检测框数量
+        """
+        matcher = self.matcher
+        np.copyto(self._all_boxes, matcher.boxes)
+        np.copyto(self._all_boxes, self.refined_boxes, where=self._is_cluster)
+        np.copyto(self._all_counts, matcher.counts)
+        np.copyto(self._all_counts, self.refined_counts, where=self._is_cluster[:, 0, 0])
+        np.less(self._slots, self._all_counts[:, None], out=self._valid)
+
+        count = int(np.count_nonzero(self._valid))
+        found = self._found[:count]
+        np.compress(self._valid.ravel(), self._all_boxes.reshape(-1, 4), axis=0, out=found)
+
+        # 红框以目标为中心：左上角 = 目标左上角 - (红框尺寸 - 目标尺寸) // 2（第 2、3 列此后不再使用）
+        np.subtract(self.box_dims['width'], found[:, 2], out=found[:, 2])
+        np.subtract(self.box_dims['height'], found[:, 3], out=found[:, 3])
+        np.floor_divide(found[:, 2:], 2, out=found[:, 2:])
+        np.subtract(found[:, :2], found[:, 2:], out=found[:, :2])
+
+        # 跟踪键 = (x 所在网格) << 32 + (y 所在网格)
+        keys, key_y = self._found_keys[:count], self._key_y[:count]
+        np.floor_divide(found[:, 0], self.GRID_SIZE, out=keys, casting='unsafe')
+        np.floor_divide(found[:, 1], self.GRID_SIZE, out=key_y, casting='unsafe')
+        np.left_shift(keys, 32, out=keys)
+        np.add(keys, key_y, out=keys)
+        self.found_count = count
+        return count
+
+    def frame_rects(self):
+        """本帧检测到的红框 (x, y, w, h) 列表（单次检测直接显示，只在发送结果时创建 Python 对象）。"""
+        box_w, box_h = self.box_dims['width'], self.box_dims['height']
+        return [(x, y, box_w, box_h) for x, y in self._found[:self.found_count, :2].tolist()]
 
-    # 执行模板匹配
-    res = cv2.matchTemplate(img_gray, template, cv2.TM_CCOEFF_NORMED)
-    locations = np.where(res >= threshold)
+    def update_stable_rects(self, current_time):
+        """使用连续帧确认机制更新稳定的红框；只有显示的红框变化时才重建 QRect 列表。"""
+        count = self.collect_boxes()
+        keys = self._found_keys[:count]
+        # 同一网格内有多个检测框时保留最后一个
+        unique_keys, last = np.unique(keys[::-1], return_index=True)
+        positions = self._found[count - 1 - last, :2]
 
-    rects = []  # boxes as [x, y, w, h]
-    scores = []
-    for pt in zip(*locations[::-1]):
-        x, y = pt
-        rects.append([int(x), int(y), int(w), int(h)])
-        # res 的索引为 [row=y, col=x]
-        scores.append(float(res[y, x]))
+        active = self._track_active
+        track_keys = self._track_keys
+        seen = active & np.isin(track_keys, unique_keys)
+        missed = active & ~seen
 
-    # 如果没有找到匹配项，则返回空列表，但仍返回 w,h
-    if not rects:
-        return template_index, [], w, h
+        # 本帧检测到：增加出现计数，重置消失计数，更新位置；达到出现阈值后确认显示（一旦确认就保持）
+        if seen.any():
+            slots = np.flatnonzero(seen)
+            self._track_pos[slots] = positions[np.searchsorted(unique_keys, track_keys[slots])]
+            self._track_appear[slots] = np.minimum(self._track_appear[slots] + 1, self.appear_frames)
+            self._track_disappear[slots] = 0
+            self._track_time[slots] = current_time
+            self._track_confirmed[slots] |= self._track_appear[slots] >= self.appear_frames
 
-    # 使用 NMS 去除重叠
-    try:
-        indices = cv2.dnn.NMSBoxes(rects, scores, threshold, 0.3)
-    except Exception:
-        # 如果 NMS 调用失败，直接将所有 rects 作为最终结果
-        return template_index, rects, w, h
+        # 本帧未检测到：增加消失计数；达到消失阈值且超过消失延迟后才删除
+        if missed.any():
+            self._track_disappear[missed] += 1
+            expired = missed & (self._track_disappear >= self.disappear_frames)
+            if self.disappear_delay != 0:
+                expired &= current_time - self._track_time >= self.disappear_delay
+            active[expired] = False
 
-    final_rects = []
-    if len(indices) > 0:
-        for idx in indices.flatten():
-            final_rects.append(rects[idx])
+        # 添加新检测到的目标（下一帧再次检测到时确认显示）
+        new = ~np.isin(unique_keys, track_keys[active])
+        if new.any():
+            new_count = int(np.count_nonzero(new))
+            free = np.flatnonzero(~active)
+            if len(free) < new_count:
+                self._allocate_tracks(2 * (len(active) + new_count))
+                active = self._track_active
+                free = np.flatnonzero(~active)
+            slots = free[:new_count]
+            active[slots] = True
+            self._track_keys[slots] = unique_keys[new]
+            self._track_pos[slots] = positions[new]
+            self._track_appear[slots] = 1
+            self._track_disappear[slots] = 0
+            self._track_confirmed[slots] = False
+            self._track_time[slots] = current_time
+
+        # 只有显示的红框真正改变时才创建 Python 对象和 QRect（减少不必要的对象创建和重绘）
+        shown = self._track_pos[active & self._track_confirmed]
+        if not np.array_equal(shown, self._shown):
+            self._shown = shown
+            box_w, box_h = self.box_dims['width'], self.box_dims['height']
+            self.current_confirmed_rects = [QRect(x, y, box_w, box_h) for x, y in shown.tolist()]
 
-    return template_index, final_rects, w, h
 
 class DetectionThread(QThread):
-    """在后台线程中执行图像检测。"""
+    """
+    在后台线程中执行图像检测。
+    所有被监测窗口共用同一个截图循环和同一个线程池。各窗口按自己的节奏独立出帧：
+    线程池中的空位按轮询方式分配给有待执行任务的窗口，模板少的窗口不必等待模板多的窗口，
+    每个窗口的任务一完成就立即发送结果并开始下一帧。
+    """
     
-    # 信号：发出检测到的矩形框列表
-    detection_signal = pyqtSignal(list)
+    # 信号：发出检测到的矩形框列表 (窗口索引, 矩形列表)
+    detection_signal = pyqtSignal(int, list)
     # 信号：报告错误消息
     error_signal = pyqtSignal(str)
+    # 信号：单次检测完成，携带触发时的 time.perf_counter() 时间戳，用于计算响应延迟
+    shot_signal = pyqtSignal(float)
 
-    def __init__(self, window_rect, targets_cv, confidence, box_dims, delay, parent=None):
+    # 等待任务完成时的最长阻塞时间（秒），保证 stop() 后能及时退出
+    POLL_INTERVAL = 0.1
+    # 单次检测的红框至少显示多久（秒）。消失延迟为 0 时红框也要留在屏幕上让人看到
+    SHOT_MIN_DISPLAY = 1.0
+
+    def __init__(self, monitors, controller=None, single_shot=False, parent=None):
+        """
+        :param monitors: 每个窗口一个字典，包含 window_rect, targets_cv, confidence, box_dims, delay，
+                         以及可选的 index (TemplateIndex)
+        :param controller: 可选的 LatencyController，用于根据延迟和CPU预算自动调整参数
+        :param single_shot: 为 True 时不持续检测，而是保持管线预热并等待 request_shot() 触发
+        """
         super().__init__(parent)
         self.is_running = False
-        self.window_rect = window_rect
-        self.targets_cv = targets_cv
-        self.confidence_threshold = confidence / 100.0
-        self.box_dims = box_dims
-        self.disappear_delay = delay
-        self.sct = None
+        self.windows = [MonitoredWindow(**monitor) for monitor in monitors]
+        self.controller = controller
+        self.single_shot = single_shot
+        self.grabber = None
         self.pool = None
-        self.last_seen_info = {} # {target_index: {'rect': QRect, 'time': float}}
-        # 稳定性控制：需要连续N帧确认才显示/消失
-        self.appear_frames = 1  # 1帧检测到就立即显示
-        self.disappear_frames = 2  # 连续2帧未检测到才消失
-        self.rect_frame_count = {}  # {rect_key: {'rect': QRect, 'appear_count': int, 'disappear_count': int, 'confirmed': bool}}
-        self.current_confirmed_rects = []  # 当前已确认显示的矩形列表
+        self.workers = 0
+        self._shot_event = threading.Event()
+        self._shot_press_time = 0.0
+
+        # 调度状态：每个窗口当前阶段待提交的任务、已提交未完成的任务数、所处阶段和本帧开始时间
+        count = len(self.windows)
+        self._queued = [deque() for _ in range(count)]
+        self._outstanding = [0] * count
+        self._phase = [None] * count  # None（空闲）/ 'match' / 'refine'
+        self._frame_start = [0.0] * count
+        self._next_window = 0
+        self._in_flight = 0
+        self._done = queue.Queue()  # 线程池回调放入 (窗口索引, 异常或 None)
+
+    def request_shot(self, press_time):
+        """请求执行一次单次检测（可从任意线程调用）。"""
+        self._shot_press_time = press_time
+        self._shot_event.set()
+
+    def _start_frame(self, window_index):
+        """截取窗口图像，并将该窗口本帧的匹配任务加入队列。"""
+        window = self.windows[window_index]
+        # 金字塔层级只在帧与帧之间切换，避免影响其他窗口正在进行的帧
+        if self.controller:
+            window.matcher.set_level(self.controller.level)
+        self._frame_start[window_index] = time.perf_counter()
+        window.capture(self.grabber)
+        self._phase[window_index] = 'match'
+        self._queued[window_index].extend(('match', i) for i in range(len(window.entries)))
+
+    def _dispatch(self):
+        """
+        向线程池提交任务，直到线程全部占满。
+        每次从下一个有待执行任务的窗口取一个任务（轮询），使各窗口平分线程池。
+        """
+        count = len(self.windows)
+        skipped = 0
+        while self._in_flight < self.workers and skipped < count:
+            window_index = self._next_window
+            self._next_window = (window_index + 1) % count
+            if not self._queued[window_index]:
+                skipped += 1
+                continue
+            skipped = 0
+            task = self._queued[window_index].popleft()
+            self._outstanding[window_index] += 1
+            self._in_flight += 1
+            self.pool.apply_async(self._run_task, (window_index, task), callback=self._done.put)
+
+    def _run_task(self, window_index, task):
+        """在线程池中执行单个任务：匹配一个模板，或细化一个命中的簇。"""
+        kind, entry_index = task
+        try:
+            window = self.windows[window_index]
+            if kind == 'match':
+                window.matcher.match_template(entry_index)
+            else:
+                window.refine_entry(entry_index)
+        except Exception as e:
+            return window_index, e
+        return window_index, None
+
+    def _wait_task(self, timeout):
+        """
+        等待一个任务完成。
+        :return: 本帧已全部完成的窗口索引；没有窗口完成（或超时）时返回 None
+        """
+        try:
+            window_index, error = self._done.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if error is not None:
+            raise error
+
+        self._outstanding[window_index] -= 1
+        self._in_flight -= 1
+        if self._outstanding[window_index] or self._queued[window_index]:
+            return None
+
+        window = self.windows[window_index]
+        if self._phase[window_index] == 'match' and window.cluster_entries:
+            # 匹配阶段完成后，对代表图命中的簇在命中位置附近继续匹配簇内成员
+            self._phase[window_index] = 'refine'
+            self._queued[window_index].extend(('refine', i) for i in window.cluster_entries)
+            return None
+
+        self._phase[window_index] = None
+        return window_index
 
     def run(self):
-        """线程主循环。"""
+        """
+        线程入口。截图器在本线程中创建和释放（GDI 句柄只能在创建它的线程中使用）。
+        线程池也只在本线程中创建、重建和关闭，stop() 不直接操作线程池，避免与 _resize_pool 竞争。
+        """
         self.is_running = True
-        self.sct = mss.mss()
-        
-        # 初始化进程池
+        self.grabber = create_grabber()
+        try:
+            self._run()
+        finally:
+            if self.pool:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+            self.grabber.close()
+
+    def _run(self):
+        """线程主循环。"""
+
+        # 没有可匹配模板的窗口不参与调度
+        active = [i for i, window in enumerate(self.windows) if window.entries]
+        if not active:
+            self.error_signal.emit("错误：没有设置任何监测目标图片。")
+            return
+
+        # 初始化线程池。匹配在本进程内完成，各线程直接写入预分配的缓冲区；
+        # OpenCV 在 matchTemplate 期间会释放 GIL，因此线程可以真正并行。
         try:
-            # 限制进程数量，避免CPU满载
-            cpu_count = max(1, multiprocessing.cpu_count() - 1) 
-            self.pool = multiprocessing.Pool(processes=cpu_count)
+            # 所有窗口共用一个线程池：线程数随任务量增长，但不超过 CPU 核数 - 1
+            cpu_count = max(1, multiprocessing.cpu_count() - 1)
+            max_workers = min(cpu_count, sum(len(self.windows[i].entries) for i in active))
+            if self.controller:
+                self.controller.max_workers = min(self.controller.max_workers, max_workers)
+                self.controller.workers = min(self.controller.workers, max_workers)
+            self._resize_pool(self.controller.workers if self.controller else max_workers)
         except Exception as e:
-            self.error_signal.emit(f"初始化进程池失败: {e}")
+            self.error_signal.emit(f"初始化线程池失败: {e}")
             return
 
-        if not self.targets_cv:
-            self.error_signal.emit("错误：没有设置任何监测目标图片。")
+        if self.single_shot:
+            self._run_single_shot(active)
             return
-            
+
+        # 每个窗口下一帧的开始时间（受控制器的帧率限制）
+        due = {window_index: time.perf_counter() for window_index in active}
+        last_wall = time.perf_counter()
+        last_cpu = time.process_time()
+
         while self.is_running:
             try:
-                # 1. 截取游戏窗口图像
-                screenshot = self.sct.grab(self.window_rect)
-                img = np.array(screenshot)
-                img_gray = cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY)
-
-                current_time = time.time()
-                found_rects_this_frame = []
-                
-                # 2. 构建多进程任务
-                tasks = [(img_gray, template, self.confidence_threshold, i) for i, template in enumerate(self.targets_cv)]
-                
-                # 3. 并行执行模板匹配
-                results = self.pool.map(match_template_worker, tasks)
-
-                # 4. 处理匹配结果，构建本帧检测到的所有矩形
-                for template_index, final_rects, w, h in results:
-                    if not final_rects:
-                        continue
-
-                    for i, rect_coords in enumerate(final_rects):
-                        # rect_coords is [x, y, w, h]
-                        x, y, tw, th = rect_coords
-                        box_w, box_h = self.box_dims['width'], self.box_dims['height']
-
-                        x_offset = (box_w - tw) // 2
-                        y_offset = (box_h - th) // 2
-
-                        # QRect(x, y, width, height)
-                        final_rect = QRect(int(x - x_offset), int(y - y_offset), int(box_w), int(box_h))
-                        found_rects_this_frame.append(final_rect)
-
-                # 5. 使用连续帧确认机制更新稳定的矩形列表
-                self._update_stable_rects(found_rects_this_frame, current_time)
-
-                # 6. 发送最终要绘制的矩形列表（仅在有变化时发送）
-                self.detection_signal.emit(self.current_confirmed_rects)
+                # 1. 为到期的空闲窗口截图并排入匹配任务，再按轮询方式填满线程池
+                now = time.perf_counter()
+                for window_index in active:
+                    if self._phase[window_index] is None and now >= due[window_index]:
+                        self._start_frame(window_index)
+                self._dispatch()
+
+                # 2. 等待任意任务完成；若有空闲窗口尚未到期，最多等到它到期
+                idle_due = [due[i] for i in active if self._phase[i] is None]
+                timeout = self.POLL_INTERVAL
+                if idle_due:
+                    timeout = min(timeout, max(0.0, min(idle_due) - time.perf_counter()))
+                window_index = self._wait_task(timeout)
+                if window_index is None:
+                    continue
+
+                # 3. 该窗口本帧完成：使用连续帧确认机制更新稳定的矩形列表并立即发送
+                window = self.windows[window_index]
+                window.report_overflow()
+                window.update_stable_rects(time.time())
+                self.detection_signal.emit(window_index, window.current_confirmed_rects)
+
+                # 4. 自适应调节：测量该窗口本帧耗时和CPU占用，必要时调整参数，并按帧率安排下一帧
+                finished = time.perf_counter()
+                if self.controller:
+                    cpu_now = time.process_time()
+                    cpu_usage = (cpu_now - last_cpu) / max(finished - last_wall, 1e-6) / multiprocessing.cpu_count() * 100
+                    last_wall, last_cpu = finished, cpu_now
+
+                    if self.controller.update(finished - self._frame_start[window_index], cpu_usage):
+                        self._apply_controller()
+                    due[window_index] = self._frame_start[window_index] + 1.0 / self.controller.fps
+                else:
+                    due[window_index] = finished
 
             except Exception as e:
+                # 停止过程中出现的错误无需报告
+                if self.is_running:
+                    self.error_signal.emit(f"检测线程出错: {e}")
+                    self.stop()
+
+    def _shoot(self, active):
+        """
+        每个窗口截图并匹配一次，按完成顺序逐个产出窗口索引（此时该窗口的检测框已汇总好）。
+        """
+        for window_index in active:
+            self._start_frame(window_index)
+        remaining = set(active)
+        while remaining and self.is_running:
+            self._dispatch()
+            window_index = self._wait_task(self.POLL_INTERVAL)
+            if window_index is None:
+                continue
+            window = self.windows[window_index]
+            window.report_overflow()
+            window.collect_boxes()
+            remaining.discard(window_index)
+            yield window_index
+
+    def _run_single_shot(self, active):
+        """
+        单次检测循环：先完整预热一次（截图器、各层缓冲区、模板频谱和线程池都在此时就绪），
+        之后在两次请求之间阻塞等待（不占用CPU），收到请求后每个窗口截图并匹配一次，
+        显示 disappear_delay 秒（至少 SHOT_MIN_DISPLAY 秒）后清除红框。
+        预热完成前收到的请求从预热完成时开始计算延迟，预热时间单独记录在日志中。
+        """
+        try:
+            warm_start = time.perf_counter()
+            for _ in self._shoot(active):
+                pass
+            ready = time.perf_counter()
+            logger.info("单次检测线程预热完成，耗时 %.1f ms", (ready - warm_start) * 1000)
+        except Exception as e:
+            if self.is_running:
                 self.error_signal.emit(f"检测线程出错: {e}")
                 self.stop()
+            return
 
-    def _rect_key(self, rect):
-        """生成矩形的唯一键，用于跟踪（容忍小范围移动）。"""
-        # 使用20像素网格对齐，使相近位置的矩形被视为同一个
-        grid_size = 20
-        x = (rect.x() // grid_size) * grid_size
-        y = (rect.y() // grid_size) * grid_size
-        return f"{x}_{y}_{rect.width()}_{rect.height()}"
-    
-    def _update_stable_rects(self, found_rects, current_time):
-        """使用连续帧确认机制更新稳定的矩形列表。"""
-        # 创建本帧检测到的矩形键集合
-        found_keys = set()
-        found_key_to_rect = {}
-        for rect in found_rects:
-            key = self._rect_key(rect)
-            found_keys.add(key)
-            found_key_to_rect[key] = rect
-        
-        # 更新所有跟踪的矩形计数
-        keys_to_delete = []
-        for key, info in self.rect_frame_count.items():
-            if key in found_keys:
-                # 本帧检测到：增加出现计数，重置消失计数
-                info['appear_count'] = min(info['appear_count'] + 1, self.appear_frames)
-                info['disappear_count'] = 0
-                info['rect'] = found_key_to_rect[key]  # 更新位置
-                info['time'] = current_time
-                
-                # 达到出现阈值，确认显示（一旦确认就保持）
-                if info['appear_count'] >= self.appear_frames:
-                    info['confirmed'] = True
-            else:
-                # 本帧未检测到：增加消失计数，不重置出现计数
-                info['disappear_count'] += 1
-                
-                # 达到消失阈值才删除（一旦确认显示就保持到明确消失）
-                if info['disappear_count'] >= self.disappear_frames:
-                    if self.disappear_delay == 0 or current_time - info['time'] >= self.disappear_delay:
-                        keys_to_delete.append(key)
-                        continue
-        
-        # 删除过期的矩形
-        for key in keys_to_delete:
-            del self.rect_frame_count[key]
-        
-        # 添加新检测到的矩形
-        for key in found_keys:
-            if key not in self.rect_frame_count:
-                self.rect_frame_count[key] = {
-                    'rect': found_key_to_rect[key],
-                    'appear_count': 1,
-                    'disappear_count': 0,
-                    'confirmed': False,
-                    'time': current_time
-                }
-        
-        # 更新当前确认的矩形列表
-        new_confirmed = [info['rect'] for info in self.rect_frame_count.values() if info['confirmed']]
-        
-        # 只有当列表真正改变时才更新（减少不必要的重绘）
-        if self._rects_changed(self.current_confirmed_rects, new_confirmed):
-            self.current_confirmed_rects = new_confirmed
-    
-    def _rects_changed(self, old_rects, new_rects):
-        """检查两个矩形列表是否不同。"""
-        if len(old_rects) != len(new_rects):
-            return True
-        # 简单比较：检查是否所有矩形都相同
-        old_set = set((r.x(), r.y(), r.width(), r.height()) for r in old_rects)
-        new_set = set((r.x(), r.y(), r.width(), r.height()) for r in new_rects)
-        return old_set != new_set
+        clear_at = [None] * len(self.windows)  # 每个窗口红框的清除时间
+        while self.is_running:
+            pending = [deadline for deadline in clear_at if deadline is not None]
+            timeout = max(0.0, min(pending) - time.time()) if pending else None
+            triggered = self._shot_event.wait(timeout)
+            if not self.is_running:
+                break
 
-    def stop(self):
-        """停止线程并清理资源。"""
-        self.is_running = False
+            try:
+                if triggered:
+                    self._shot_event.clear()
+                    press_time = self._shot_press_time
+                    if press_time < ready:
+                        logger.info("按键时单次检测线程仍在预热，等待了 %.1f ms（不计入按键延迟）",
+                                    (ready - press_time) * 1000)
+                        press_time = ready
+
+                    # 每个窗口完成后立即发送结果，不等待其他窗口
+                    for window_index in self._shoot(active):
+                        window = self.windows[window_index]
+                        rects = [QRect(*rect) for rect in window.frame_rects()]
+                        self.detection_signal.emit(window_index, rects)
+                        clear_at[window_index] = time.time() + max(window.disappear_delay, self.SHOT_MIN_DISPLAY)
+                    self.shot_signal.emit(press_time)
+                else:
+                    current_time = time.time()
+                    for window_index, deadline in enumerate(clear_at):
+                        if deadline is not None and current_time >= deadline:
+                            self.detection_signal.emit(window_index, [])
+                            clear_at[window_index] = None
+
+            except Exception as e:
+                if self.is_running:
+                    self.error_signal.emit(f"检测线程出错: {e}")
+                    self.stop()
+
+    def _resize_pool(self, workers):
+        """按指定线程数（重新）创建线程池。"""
         if self.pool:
             self.pool.close()
             self.pool.join()
+        self.pool = ThreadPool(processes=workers)
+        self.workers = workers
+
+    def _apply_controller(self):
+        """将控制器的线程数应用到线程池（金字塔层级在每个窗口开始新的一帧时应用）。"""
+        if self.controller.workers != self.workers:
+            self._resize_pool(self.controller.workers)
+
+    def stop(self):
+        """
+        请求停止线程（可从任意线程调用）。主循环最多在 POLL_INTERVAL 秒内退出，
+        线程池和截图器在 run() 退出时释放；需要等待释放完成时调用 wait()。
+        """
+        self.is_running = False
+        # 唤醒可能正在等待单次检测请求的线程
+        self._shot_event.set()
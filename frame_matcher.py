@@ -0,0 +1,336 @@
+# frame_matcher.py
+
+import logging
+import threading
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class FrameMatcher:
+    """
+    为固定尺寸的游戏画面预分配并复用所有匹配缓冲区。
+    灰度图、每个模板的匹配结果矩阵以及检测框数组都只在首次使用（或窗口尺寸变化）时分配，
+    之后每一帧都由 OpenCV 直接写入这些缓冲区，稳态下不再产生新的图像内存
+    （可用 benchmarks/bench_steady_state_allocations.py 验证）。
+    支持在图像金字塔的较高层级（缩小后的画面和模板）上匹配，以精度换取速度。
+
+    模板在加载时按尺寸分组。归一化相关系数 (TM_CCOEFF_NORMED) 的分母只与画面窗口的
+    统计量有关，同尺寸的模板可以共用：每帧只计算一次积分图，每组只计算一次窗口方差。
+    分子（与零均值、单位范数模板的互相关）在频域中计算：画面按固定大小分块（重叠保留法），
+    每帧每个层级只对各分块做一次正向 DFT，供所有组共用；每个模板的频谱在加载时预先计算，
+    匹配时只需逐块做频谱相乘和一次逆 DFT。
+    因此每帧的耗时 = 画面侧的共享部分 + 模板数 x 单个模板的逆变换，后者比完整的
+    matchTemplate 更便宜，组越大，平均到每个模板的耗时越低（见 benchmarks/bench_batched_matching.py）。
+    代价是每个批量模板要额外保存一份分块大小的频谱（50x70 的模板约 300 KB）。
+    单个模板的组直接使用 TM_CCOEFF_NORMED。
+    """
+
+    # 每个模板每帧最多保留的检测框数量（可通过配置项 max_matches_per_template 修改）
+    DEFAULT_CAPACITY = 32
+    # NMS 抑制范围（相对模板尺寸的比例），与原 NMSBoxes 的 0.3 IoU 阈值效果相近
+    SUPPRESS_RATIO = 0.5
+    # 窗口标准差低于该值视为纯色区域，相关系数记为 0
+    FLAT_EPSILON = 1e-3
+    # 同尺寸模板达到该数量时才共享画面侧统计量，单个模板直接使用 TM_CCOEFF_NORMED
+    BATCH_MIN_GROUP = 2
+    # 频域分块的边长约为模板尺寸的该倍数，且不小于 DFT_MIN_SIZE：
+    # 分块过小时逐块调用的开销和重叠部分的浪费会抵消共享正向变换的收益
+    DFT_TILE_RATIO = 4
+    DFT_MIN_SIZE = 256
+
+    def __init__(self, templates, thresholds, capacity=DEFAULT_CAPACITY):
+        """
+        :param templates: 灰度模板列表
+        :param thresholds: 匹配阈值，可以是所有模板共用的一个数，也可以是每个模板各自的阈值列表
+        :param capacity: 每个模板每帧最多保留的检测框数量，超出的检测框会被丢弃并记录在 overflowed 中
+        """
+        self.templates = templates
+        self.thresholds = np.broadcast_to(np.asarray(thresholds, dtype=np.float32), (len(templates),)).copy()
+        self.capacity = capacity
+        self.frame_shape = None
+        self.gray = None
+        # 当前使用的金字塔层级，画面和模板都缩小为原来的 1 / 2**level
+        self.level = 0
+        self._levels = {}  # {level: {'gray', 'templates', 'results', 'group_of', 'groups', 以及批量组共用的积分图、分块频谱和临时缓冲区}}
+        self._local = threading.local()  # 各工作线程逆变换用的临时缓冲区
+        self._flat_reported = set()  # 已记录过警告的纯色模板索引
+
+        # 加载时按模板尺寸分组：{(高, 宽): [模板索引, ...]}
+        self.groups = {}
+        for index, template in enumerate(templates):
+            if template is not None:
+                self.groups.setdefault(template.shape, []).append(index)
+
+        count = len(templates)
+        self.boxes = np.zeros((count, capacity, 4), dtype=np.int32)  # [x, y, w, h]
+        self.scores = np.zeros((count, capacity), dtype=np.float32)
+        self.counts = np.zeros(count, dtype=np.int32)
+        # 本帧是否有检测框因达到容量上限而被丢弃
+        self.overflowed = np.zeros(count, dtype=bool)
+
+    def set_level(self, level):
+        """切换金字塔层级，应在两帧之间调用。各层级的缓冲区首次使用时分配，之后一直复用。"""
+        self.level = level
+
+    def _ensure_buffers(self, height, width):
+        """当画面尺寸变化时（重新）分配原始分辨率的灰度图，并丢弃各层级的缓冲区。"""
+        if self.frame_shape == (height, width):
+            return
+        self.frame_shape = (height, width)
+        self.gray = np.empty((height, width), dtype=np.uint8)
+        self._levels = {}
+
+    def _normalize_template(self, template):
+        """将模板转换为零均值、单位范数的 float32 模板（调用前已排除纯色模板）。"""
+        normalized = template.astype(np.float32)
+        normalized -= normalized.mean()
+        normalized /= float(np.sqrt(np.sum(normalized * normalized)))
+        return normalized
+
+    def _skip_flat(self, index, template):
+        """
+        纯色模板与任何画面的相关系数都没有意义（TM_CCOEFF_NORMED 会处处返回 1 而占满容量），
+        无论是否与其他模板同组都跳过，并记录一次警告。
+        """
+        if template.min() != template.max():
+            return False
+        if index not in self._flat_reported:
+            self._flat_reported.add(index)
+            height, width = self.templates[index].shape
+            logger.warning("第 %d 个模板（%dx%d）是纯色图像，无法进行模板匹配，已跳过", index + 1, width, height)
+        return True
+
+    def _level_buffers(self, level):
+        """获取指定层级的缓冲区，不存在时分配。"""
+        buffers = self._levels.get(level)
+        if buffers is not None:
+            return buffers
+
+        height, width = self.frame_shape
+        scale = 2 ** level
+        if level == 0:
+            gray = self.gray
+        else:
+            gray = np.empty((max(1, height // scale), max(1, width // scale)), dtype=np.uint8)
+        gh, gw = gray.shape
+
+        buffers = {
+            'gray': gray,
+            'templates': [None] * len(self.templates),
+            'spectra': [None] * len(self.templates),
+            'results': [None] * len(self.templates),
+            'group_of': [None] * len(self.templates),
+            'groups': [],
+        }
+
+        # 先确定每组在该层级的尺寸，模板比画面还大时无法匹配，不分配结果矩阵
+        level_groups = []
+        for (th, tw), members in self.groups.items():
+            mh, mw = (th, tw) if level == 0 else (max(1, th // scale), max(1, tw // scale))
+            if mh <= gh and mw <= gw:
+                level_groups.append(((mh, mw), members))
+
+        # 只有成员数达到 BATCH_MIN_GROUP 的组才走共享统计量的路径，
+        # 单个模板直接调用 TM_CCOEFF_NORMED，避免额外的整幅画面计算和缓冲区
+        batched_shapes = [shape for shape, members in level_groups if len(members) >= self.BATCH_MIN_GROUP]
+        if batched_shapes:
+            self._allocate_shared(buffers, batched_shapes)
+
+        for (mh, mw), members in level_groups:
+            rh, rw = gh - mh + 1, gw - mw + 1
+            batched = len(members) >= self.BATCH_MIN_GROUP
+            if batched:
+                # 每组只保留 1 / 窗口标准差，供组内所有模板共用
+                group = {'shape': (mh, mw), 'members': members,
+                         'inv_norm': np.empty((rh, rw), dtype=np.float32)}
+                group_index = len(buffers['groups'])
+                buffers['groups'].append(group)
+
+            for index in members:
+                template = self.templates[index]
+                if level > 0:
+                    template = cv2.resize(template, (mw, mh), interpolation=cv2.INTER_AREA)
+                if self._skip_flat(index, template):
+                    continue
+                if batched:
+                    template = self._normalize_template(template)
+                    buffers['group_of'][index] = group_index
+                    buffers['spectra'][index] = self._template_spectrum(template, buffers['dft_shape'])
+                buffers['templates'][index] = template
+                buffers['results'][index] = np.empty((rh, rw), dtype=np.float32)
+
+        self._levels[level] = buffers
+        return buffers
+
+    def _allocate_shared(self, buffers, batched_shapes):
+        """
+        分配批量组共用的画面侧缓冲区：积分图 / 平方积分图、按最大结果尺寸分配并由各组依次复用的
+        临时缓冲区，以及频域分块所需的补零画面和各分块的频谱。
+        """
+        gh, gw = buffers['gray'].shape
+        max_th = max(th for th, _ in batched_shapes)
+        max_tw = max(tw for _, tw in batched_shapes)
+        scratch_size = max((gh - th + 1) * (gw - tw + 1) for th, tw in batched_shapes)
+
+        # 所有批量组使用同一套分块，每帧只需一次正向变换。
+        # 每块的前 step 行 / 列对最大的模板也不会发生循环卷绕，因此对所有组都是有效输出。
+        dft_h = cv2.getOptimalDFTSize(min(max(self.DFT_MIN_SIZE, self.DFT_TILE_RATIO * max_th), gh))
+        dft_w = cv2.getOptimalDFTSize(min(max(self.DFT_MIN_SIZE, self.DFT_TILE_RATIO * max_tw), gw))
+        step = (dft_h - max_th + 1, dft_w - max_tw + 1)
+        max_rh = gh - min(th for th, _ in batched_shapes) + 1
+        max_rw = gw - min(tw for _, tw in batched_shapes) + 1
+        tiles = [(y, x) for y in range(0, max_rh, step[0]) for x in range(0, max_rw, step[1])]
+
+        # 补零后的画面覆盖最后一块的完整范围，边缘分块不需要单独处理；补零区域始终保持为 0
+        padded = np.zeros((tiles[-1][0] + dft_h, tiles[-1][1] + dft_w), dtype=np.float32)
+        buffers.update({
+            'gray_f': padded[:gh, :gw],
+            'padded': padded,
+            'sum': np.empty((gh + 1, gw + 1), dtype=np.float64),
+            'sqsum': np.empty((gh + 1, gw + 1), dtype=np.float64),
+            'win_sum': np.empty(scratch_size, dtype=np.float64),
+            'win_sq': np.empty(scratch_size, dtype=np.float64),
+            'valid': np.empty(scratch_size, dtype=bool),
+            'dft_shape': (dft_h, dft_w),
+            'tile_step': step,
+            'tiles': tiles,
+            'tile_spectra': np.empty((len(tiles), dft_h, dft_w), dtype=np.float32),
+        })
+
+    def _template_spectrum(self, template, dft_shape):
+        """模板补零到分块大小后的频谱（CCS 紧凑格式），加载时计算一次。"""
+        padded = np.zeros(dft_shape, dtype=np.float32)
+        padded[:template.shape[0], :template.shape[1]] = template
+        return cv2.dft(padded)
+
+    def _thread_scratch(self, dft_shape):
+        """当前线程的频谱乘积和逆变换输出缓冲区，每个线程首次使用时分配，之后复用。"""
+        scratch = getattr(self._local, 'scratch', None)
+        if scratch is None or scratch[0].shape != dft_shape:
+            scratch = (np.empty(dft_shape, dtype=np.float32), np.empty(dft_shape, dtype=np.float32))
+            self._local.scratch = scratch
+        return scratch
+
+    def _window_sums(self, integral, th, tw, out):
+        """利用积分图计算所有 th x tw 窗口的像素和，结果写入 out。"""
+        np.subtract(integral[th:, tw:], integral[:-th, tw:], out=out)
+        np.subtract(out, integral[th:, :-tw], out=out)
+        np.add(out, integral[:-th, :-tw], out=out)
+
+    def _prepare_group(self, buffers, group):
+        """计算一组同尺寸模板共用的分母：1 / 窗口标准差（纯色窗口记为 0）。"""
+        th, tw = group['shape']
+        inv_norm = group['inv_norm']
+        # 临时缓冲区按本组的结果尺寸取视图，各组依次复用同一块内存
+        size = inv_norm.size
+        win_sum = buffers['win_sum'][:size].reshape(inv_norm.shape)
+        win_sq = buffers['win_sq'][:size].reshape(inv_norm.shape)
+        valid = buffers['valid'][:size].reshape(inv_norm.shape)
+        self._window_sums(buffers['sum'], th, tw, win_sum)
+        self._window_sums(buffers['sqsum'], th, tw, win_sq)
+
+        # 窗口方差 * n = sum(I^2) - sum(I)^2 / n
+        np.multiply(win_sum, win_sum, out=win_sum)
+        np.multiply(win_sum, 1.0 / (th * tw), out=win_sum)
+        np.subtract(win_sq, win_sum, out=win_sq)
+        np.maximum(win_sq, 0.0, out=win_sq)
+        np.sqrt(win_sq, out=win_sq)
+
+        np.greater(win_sq, self.FLAT_EPSILON, out=valid)
+        inv_norm.fill(0.0)
+        np.divide(1.0, win_sq, out=inv_norm, where=valid, casting='same_kind')
+
+    def load_frame(self, frame_bgra):
+        """
+        将 BGRA 画面转换为灰度图，写入预分配的灰度缓冲区（必要时再缩小到当前层级），
+        并计算本帧所有模板组共用的画面侧统计量。
+        """
+        height, width = frame_bgra.shape[:2]
+        self._ensure_buffers(height, width)
+        cv2.cvtColor(frame_bgra, cv2.COLOR_BGRA2GRAY, dst=self.gray)
+
+        buffers = self._level_buffers(self.level)
+        gray = buffers['gray']
+        if self.level > 0:
+            gh, gw = gray.shape
+            cv2.resize(self.gray, (gw, gh), dst=gray, interpolation=cv2.INTER_AREA)
+
+        if buffers['groups']:
+            np.copyto(buffers['gray_f'], gray)
+            cv2.integral2(gray, sum=buffers['sum'], sqsum=buffers['sqsum'],
+                          sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+            for group in buffers['groups']:
+                self._prepare_group(buffers, group)
+            # 各分块的正向 DFT，本帧所有批量组的模板共用
+            padded, spectra = buffers['padded'], buffers['tile_spectra']
+            dft_h, dft_w = buffers['dft_shape']
+            for k, (y, x) in enumerate(buffers['tiles']):
+                cv2.dft(padded[y:y + dft_h, x:x + dft_w], dst=spectra[k])
+        self.counts.fill(0)
+        self.overflowed.fill(False)
+
+    def match_template(self, index):
+        """
+        匹配单个模板，结果写入 boxes/scores/counts 的对应行。
+        不同模板使用互不重叠的缓冲区，因此可以在线程池中并行调用。
+        :return: 该模板本帧的检测框数量
+        """
+        buffers = self._levels[self.level]
+        res = buffers['results'][index]
+        if res is None:
+            return 0
+
+        template = buffers['templates'][index]
+        group_index = buffers['group_of'][index]
+        if group_index is None:
+            cv2.matchTemplate(buffers['gray'], template, cv2.TM_CCOEFF_NORMED, result=res)
+        else:
+            # 零均值、单位范数模板的互相关即为归一化相关系数的分子，再乘以组内共用的窗口分母
+            self._correlate(buffers, buffers['spectra'][index], res)
+            np.multiply(res, buffers['groups'][group_index]['inv_norm'], out=res)
+        return self._collect_peaks(index, res, template.shape, self.templates[index].shape)
+
+    def _correlate(self, buffers, spectrum, res):
+        """逐块将画面频谱与模板频谱相乘并做逆 DFT，把每块的有效部分写入结果矩阵。"""
+        product, output = self._thread_scratch(buffers['dft_shape'])
+        spectra = buffers['tile_spectra']
+        step_y, step_x = buffers['tile_step']
+        rh, rw = res.shape
+        for k, (y, x) in enumerate(buffers['tiles']):
+            if y >= rh or x >= rw:
+                continue
+            h, w = min(step_y, rh - y), min(step_x, rw - x)
+            cv2.mulSpectrums(spectra[k], spectrum, 0, c=product, conjB=True)
+            cv2.dft(product, dst=output, flags=cv2.DFT_INVERSE | cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT)
+            np.copyto(res[y:y + h, x:x + w], output[:h, :w])
+
+    def _collect_peaks(self, index, res, match_shape, template_shape):
+        """
+        逐个取出结果矩阵中的最高分，并原地抑制其邻域（贪心 NMS），
+        直到分数低于该模板的阈值或达到容量上限。坐标会换算回原始分辨率。
+        达到容量上限时若仍有超过阈值的位置，则在 overflowed 中标记该模板。
+        """
+        boxes = self.boxes[index]
+        scores = self.scores[index]
+        threshold = self.thresholds[index]
+        scale = 2 ** self.level
+        th, tw = template_shape
+        rx = max(1, int(match_shape[1] * self.SUPPRESS_RATIO))
+        ry = max(1, int(match_shape[0] * self.SUPPRESS_RATIO))
+
+        count = 0
+        while count < self.capacity:
+            _, max_val, _, (x, y) = cv2.minMaxLoc(res)
+            if max_val < threshold:
+                break
+            boxes[count] = (x * scale, y * scale, tw, th)
+            scores[count] = max_val
+            count += 1
+            # 抑制该峰值附近的位置，避免同一目标重复出框
+            res[max(0, y - ry + 1):y + ry, max(0, x - rx + 1):x + rx] = -1.0
+        else:
+            self.overflowed[index] = cv2.minMaxLoc(res)[1] >= threshold
+
+        self.counts[index] = count
+        return count
@@ -1,41 +1,52 @@
 # hotkey_listener.py
 
+import time
 from PyQt6.QtCore import QThread, pyqtSignal
 from pynput import keyboard
 
 class HotkeyListener(QThread):
     """在后台监听全局热键。"""
-    
+
     # 信号：当热键被按下时发出
     hotkey_pressed = pyqtSignal()
+    # 信号：当单次检测热键被按下时发出，携带按键时的 time.perf_counter() 时间戳
+    snapshot_pressed = pyqtSignal(float)
 
-    def __init__(self, hotkey_str, parent=None):
+    def __init__(self, hotkey_str, snapshot_hotkey_str=None, parent=None):
         super().__init__(parent)
         self.hotkey_str = hotkey_str.lower()
+        self.snapshot_hotkey_str = snapshot_hotkey_str.lower() if snapshot_hotkey_str else None
         self.listener = None
 
+    def _parse_key(self, key_str):
+        """
+        解析热键字符串。
+        这是一个简化的解析，仅支持 F1-F12 和单个字符
+        """
+        if key_str.startswith('f') and key_str[1:].isdigit():
+            return keyboard.Key[key_str]
+        return keyboard.KeyCode.from_char(key_str)
+
     def run(self):
         """启动键盘监听器。"""
         try:
-            # 解析热键字符串
-            # 这是一个简化的解析，仅支持 F1-F12 和单个字符
-            if self.hotkey_str.startswith('f') and self.hotkey_str[1:].isdigit():
-                key_to_listen = keyboard.Key[self.hotkey_str]
-            else:
-                key_to_listen = keyboard.KeyCode.from_char(self.hotkey_str)
+            key_to_listen = self._parse_key(self.hotkey_str)
+            snapshot_key = self._parse_key(self.snapshot_hotkey_str) if self.snapshot_hotkey_str else None
 
             def on_press(key):
                 if key == key_to_listen:
                     self.hotkey_pressed.emit()
-            
+                elif snapshot_key is not None and key == snapshot_key:
+                    self.snapshot_pressed.emit(time.perf_counter())
+
             self.listener = keyboard.Listener(on_press=on_press)
             self.listener.start()
             self.listener.join() # 阻塞线程直到监听器停止
-            
+
         except Exception as e:
-            print(f"无法监听热键 '{self.hotkey_str}': {e}。请尝试其他按键。")
+            print(f"无法监听热键 '{self.hotkey_str}' / '{self.snapshot_hotkey_str}': {e}。请尝试其他按键。")
 
     def stop(self):
         """停止监听器。"""
         if self.listener:
-            self.listener.stop()
\ No newline at end of file
+            self.listener.stop()
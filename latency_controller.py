@@ -0,0 +1,107 @@
+# latency_controller.py
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+class LatencyController:
+    """
+    根据每帧耗时和CPU占用，自动调整检测管线的参数（线程数、帧率、金字塔层级）。
+    所有参数都限制在用户设定的范围内，并通过上下阈值带和冷却帧数实现迟滞，避免来回振荡。
+    每次调整及其原因都会写入日志，便于事后审查。
+    """
+
+    # 平滑系数：越小越平滑，对单帧抖动越不敏感
+    SMOOTHING = 0.2
+    # 超过目标的 HIGH 倍才降级，低于目标的 LOW 倍才升级，两者之间保持不动
+    HIGH = 1.1
+    LOW = 0.6
+    # 每次调整后至少等待的帧数，让新参数下的测量值稳定下来
+    COOLDOWN_FRAMES = 30
+    # 金字塔每升高一层，匹配的像素量约减少为原来的 1/4
+    LEVEL_COST_RATIO = 4.0
+
+    def __init__(self, target_latency_ms, cpu_budget, max_workers, min_fps, max_fps, max_level):
+        """
+        :param target_latency_ms: 目标单帧处理延迟（毫秒）
+        :param cpu_budget: 允许占用的CPU比例（占整机的百分比）
+        :param max_workers: 线程数上限
+        :param min_fps: 帧率下限
+        :param max_fps: 帧率上限
+        :param max_level: 金字塔层级上限（0 表示始终使用原始分辨率）
+        """
+        self.target_latency = target_latency_ms / 1000.0
+        self.cpu_budget = cpu_budget
+        self.max_workers = max(1, max_workers)
+        self.min_fps = max(1, min_fps)
+        self.max_fps = max(self.min_fps, max_fps)
+        self.max_level = max(0, max_level)
+
+        # 初始使用最高质量，再根据测量结果逐步降级
+        self.workers = self.max_workers
+        self.fps = self.max_fps
+        self.level = 0
+
+        self.latency = None
+        self.cpu_usage = None
+        self.cooldown = self.COOLDOWN_FRAMES
+
+    def update(self, latency, cpu_usage):
+        """
+        输入一帧的测量值，必要时调整参数。
+        :param latency: 本帧处理耗时（秒）
+        :param cpu_usage: 上一周期的进程CPU占用（占整机的百分比）
+        :return: 本次是否调整了参数
+        """
+        if self.latency is None:
+            self.latency, self.cpu_usage = latency, cpu_usage
+        else:
+            self.latency += self.SMOOTHING * (latency - self.latency)
+            self.cpu_usage += self.SMOOTHING * (cpu_usage - self.cpu_usage)
+
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return False
+
+        latency_high = self.latency > self.target_latency * self.HIGH
+        latency_low = self.latency < self.target_latency * self.LOW
+        cpu_high = self.cpu_usage > self.cpu_budget * self.HIGH
+        cpu_low = self.cpu_usage < self.cpu_budget * self.LOW
+
+        if cpu_high:
+            # CPU 超出预算：优先降低帧率，其次减少线程，最后降低分辨率
+            if self.fps > self.min_fps:
+                return self._adjust('fps', max(self.min_fps, self.fps // 2), "CPU占用超出预算")
+            if self.workers > 1:
+                return self._adjust('workers', self.workers - 1, "CPU占用超出预算且帧率已达下限")
+            if self.level < self.max_level:
+                return self._adjust('level', self.level + 1, "CPU占用超出预算且帧率、线程数均已达下限")
+        elif latency_high:
+            # 延迟超出目标：CPU 尚有余量时增加线程，否则降低分辨率
+            if self.workers < self.max_workers and not self._cpu_near_budget():
+                return self._adjust('workers', self.workers + 1, "单帧延迟超出目标且CPU尚有余量")
+            if self.level < self.max_level:
+                return self._adjust('level', self.level + 1, "单帧延迟超出目标")
+        elif latency_low and cpu_low:
+            # 延迟和CPU都有充足余量：先恢复分辨率，再恢复帧率
+            if self.level > 0 and self.latency * self.LEVEL_COST_RATIO < self.target_latency * self.HIGH:
+                return self._adjust('level', self.level - 1, "延迟和CPU均有余量，恢复检测精度")
+            if self.fps < self.max_fps and self.cpu_usage * 2 < self.cpu_budget * self.HIGH:
+                return self._adjust('fps', min(self.max_fps, self.fps * 2), "延迟和CPU均有余量，提高帧率")
+        return False
+
+    def _cpu_near_budget(self):
+        """CPU 占用是否已接近预算（增加线程可能导致超出预算）。"""
+        return self.cpu_usage > self.cpu_budget * self.LOW
+
+    def _adjust(self, knob, value, reason):
+        """修改一个参数，记录日志并进入冷却期。"""
+        old_value = getattr(self, knob)
+        setattr(self, knob, value)
+        self.cooldown = self.COOLDOWN_FRAMES
+        logger.info(
+            "自动调节 %s: %s -> %s，原因: %s（平均延迟 %.1f ms / 目标 %.1f ms，CPU %.1f%% / 预算 %.1f%%）",
+            knob, old_value, value, reason,
+            self.latency * 1000, self.target_latency * 1000, self.cpu_usage, self.cpu_budget
+        )
+        return True
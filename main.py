@@ -2,25 +2,36 @@
 
 import sys
 import os
+import time
+import logging
+import multiprocessing
 import cv2
 import pygetwindow as gw
 import numpy as np
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QPushButton, QLabel, QSlider, QLineEdit, QListWidget,
-                             QListWidgetItem, QFileDialog, QAbstractItemView, QMessageBox)
+                             QListWidgetItem, QFileDialog, QAbstractItemView, QMessageBox,
+                             QComboBox)
 from PyQt6.QtGui import QIcon, QPixmap
-from PyQt6.QtCore import Qt, pyqtSlot
+from PyQt6.QtCore import Qt, QTimer, pyqtSlot
 
 # 导入其他模块
 from config_manager import ConfigManager
 from detection_thread import DetectionThread
+from latency_controller import LatencyController
+from template_index import TemplateIndex
 from overlay_window import OverlayWindow
 from hotkey_listener import HotkeyListener
 from select_window_dialog import SelectWindowDialog
 
+logger = logging.getLogger(__name__)
+
 class MainWindow(QMainWindow):
     """应用程序的主窗口。"""
-    
+
+    # 参数变化后等待多久（毫秒）再重建单次检测线程
+    SNAPSHOT_REBUILD_DELAY_MS = 300
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("GameArgus")
@@ -28,17 +39,31 @@ class MainWindow(QMainWindow):
 
         # 初始化核心组件
         self.config_manager = ConfigManager()
-        self.overlay = OverlayWindow()
         self.detection_thread = None
         self.hotkey_listener = None
+        # 单次检测模式的常驻线程及其覆盖层
+        self.snapshot_thread = None
+        self.snapshot_overlays = []
+        self.snapshot_geometry = []  # 创建单次检测线程时各窗口的 (窗口对象, 截图区域)
+        # 参数变化后延迟片刻再重建单次检测线程，连续输入或拖动滑块时只重建一次
+        self.snapshot_rebuild_timer = QTimer(self)
+        self.snapshot_rebuild_timer.setSingleShot(True)
+        self.snapshot_rebuild_timer.setInterval(self.SNAPSHOT_REBUILD_DELAY_MS)
+        self.snapshot_rebuild_timer.timeout.connect(self._rebuild_snapshot_thread)
         
         self.is_detection_running = False
-        self.target_cv_images = []
-        self.selected_window = None
+        # 每个被监测窗口的运行时状态，与配置中的 monitors 列表一一对应：
+        # {'window': 窗口对象, 'targets': [(路径, 图标, OpenCV图像)], 'index': TemplateIndex, 'overlay': OverlayWindow}
+        self.monitors = []
+        self.current_monitor = 0
+        # 本次监测中实际参与检测的窗口覆盖层，按检测线程中的窗口索引排列
+        self.active_overlays = []
 
         self.init_ui()
         self.load_settings()
         self.setup_hotkey_listener()
+        # 启动后立即在后台准备好单次检测线程，第一次按键时不必再创建
+        self._schedule_snapshot_rebuild()
         
     def init_ui(self):
         """初始化用户界面。"""
@@ -46,7 +71,23 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(central_widget)
         main_layout = QVBoxLayout(central_widget)
 
-        # 1. 窗口选择
+        # 1. 监测窗口切换与窗口选择
+        monitor_layout = QHBoxLayout()
+        monitor_layout.addWidget(QLabel("监测窗口:"))
+        self.monitor_combo = QComboBox()
+        self.monitor_combo.currentIndexChanged.connect(self.switch_monitor)
+        monitor_layout.addWidget(self.monitor_combo, 1)
+        add_monitor_btn = QPushButton("新增窗口")
+        add_monitor_btn.clicked.connect(self.add_monitor)
+        monitor_layout.addWidget(add_monitor_btn)
+        remove_monitor_btn = QPushButton("移除窗口")
+        remove_monitor_btn.clicked.connect(self.remove_monitor)
+        monitor_layout.addWidget(remove_monitor_btn)
+        monitor_layout.addWidget(self.create_info_label(
+            "可以同时监测多个游戏窗口，每个窗口拥有独立的图片列表、红框和参数。\n"
+            "所有窗口共用同一个检测线程和线程池，不会重复占用CPU。"
+        ))
+
         window_layout = QHBoxLayout()
         self.window_label = QLabel("游戏窗口: 未选择")
         select_btn = QPushButton("选择窗口")
@@ -80,6 +121,7 @@ class MainWindow(QMainWindow):
         self.confidence_slider = QSlider(Qt.Orientation.Horizontal)
         self.confidence_slider.setRange(50, 99)
         self.confidence_slider.valueChanged.connect(lambda v: self.confidence_label.setText(f"检测置信度: {v}%"))
+        self.confidence_slider.actionTriggered.connect(self._invalidate_snapshot_thread)
         
         # 红框尺寸
         box_layout = QHBoxLayout()
@@ -116,11 +158,41 @@ class MainWindow(QMainWindow):
             "修改后需要重启程序才能生效。"
         ))
         
+        # 单次检测热键
+        snapshot_layout = QHBoxLayout()
+        snapshot_layout.addWidget(QLabel("单次检测热键:"))
+        self.snapshot_hotkey_input = QLineEdit()
+        snapshot_layout.addWidget(self.snapshot_hotkey_input)
+        snapshot_layout.addWidget(self.create_info_label(
+            "按下后只截图并检测一次，红框显示“消失延迟”秒（至少 1 秒）后自动清除。\n"
+            "两次按键之间不占用CPU，适合笔记本等需要省电的场景。\n"
+            "修改后需要重启程序才能生效。"
+        ))
+
+        # 自适应调节
+        adaptive_layout = QHBoxLayout()
+        adaptive_layout.addWidget(QLabel("目标延迟(ms):"))
+        self.target_latency_input = QLineEdit()
+        adaptive_layout.addWidget(self.target_latency_input)
+        adaptive_layout.addWidget(QLabel("CPU预算(%):"))
+        self.cpu_budget_input = QLineEdit()
+        adaptive_layout.addWidget(self.cpu_budget_input)
+        adaptive_layout.addWidget(self.create_info_label(
+            "根据每帧的实际耗时和CPU占用，自动调整线程数、帧率和检测分辨率。\n"
+            "默认目标延迟为0，即关闭自动调节，以最高质量持续检测；填写目标延迟（如100）后开启。\n"
+            "调节范围可在 config.json 中修改，每次调整都会输出到日志。"
+        ))
+
+        # 检测参数被用户修改后，单次检测线程需要按新参数在后台重建
+        for line_edit in (self.box_width_input, self.box_height_input, self.delay_input):
+            line_edit.textEdited.connect(self._invalidate_snapshot_thread)
+
         # 4. 控制按钮
         self.toggle_button = QPushButton("启动监测")
         self.toggle_button.clicked.connect(self.toggle_detection)
 
         # 组装布局
+        main_layout.addLayout(monitor_layout)
         main_layout.addLayout(window_layout)
         main_layout.addWidget(QLabel("待监测图片列表:"))
         main_layout.addWidget(self.target_list_widget)
@@ -131,6 +203,8 @@ class MainWindow(QMainWindow):
         main_layout.addLayout(box_layout)
         main_layout.addLayout(delay_layout)
         main_layout.addLayout(hotkey_layout)
+        main_layout.addLayout(snapshot_layout)
+        main_layout.addLayout(adaptive_layout)
         main_layout.addSpacing(20)
         main_layout.addWidget(self.toggle_button)
 
@@ -146,33 +220,123 @@ class MainWindow(QMainWindow):
     def load_settings(self):
         """从配置文件加载UI状态。"""
         config = self.config_manager.config
-        self.confidence_slider.setValue(config['confidence'])
-        self.box_width_input.setText(str(config['box_width']))
-        self.box_height_input.setText(str(config['box_height']))
-        self.delay_input.setText(str(config['disappear_delay']))
         self.hotkey_input.setText(config['hotkey'])
+        self.snapshot_hotkey_input.setText(config['snapshot_hotkey'])
+        self.target_latency_input.setText(str(config['target_latency_ms']))
+        self.cpu_budget_input.setText(str(config['cpu_budget']))
 
-        for img_path in config['target_images']:
-            self.add_image_to_list(img_path)
-            
-        if config['window_title']:
-            try:
-                wins = gw.getWindowsWithTitle(config['window_title'])
-                if wins:
-                    self.selected_window = wins[0]
-                    self.window_label.setText(f"游戏窗口: {self.selected_window.title}")
-            except Exception:
-                self.window_label.setText("游戏窗口: (上次选择的已关闭)")
-                self.selected_window = None
+        for index, monitor_config in enumerate(config['monitors']):
+            self._create_monitor(index)
+            for img_path in list(monitor_config['target_images']):
+                self.add_image_to_list(img_path, index)
+
+            if monitor_config['window_title']:
+                try:
+                    wins = gw.getWindowsWithTitle(monitor_config['window_title'])
+                    if wins:
+                        self.monitors[index]['window'] = wins[0]
+                except Exception:
+                    self.monitors[index]['window'] = None
+            self._update_monitor_title(index)
+
+        self.monitor_combo.setCurrentIndex(0)
+        self._load_monitor_ui(0)
 
     def save_settings(self):
         """保存当前UI状态到配置文件。"""
-        self.config_manager.set('confidence', self.confidence_slider.value())
-        self.config_manager.set('box_width', int(self.box_width_input.text()))
-        self.config_manager.set('box_height', int(self.box_height_input.text()))
-        self.config_manager.set('disappear_delay', float(self.delay_input.text()))
+        self._save_monitor_ui(self.current_monitor)
         self.config_manager.set('hotkey', self.hotkey_input.text())
-        self.config_manager.set('window_title', self.selected_window.title if self.selected_window else None)
+        self.config_manager.set('snapshot_hotkey', self.snapshot_hotkey_input.text())
+        self.config_manager.set('target_latency_ms', float(self.target_latency_input.text()))
+        self.config_manager.set('cpu_budget', float(self.cpu_budget_input.text()))
+
+    def _create_monitor(self, index):
+        """为配置中的第 index 个窗口创建运行时状态和下拉框条目。"""
+        self.monitors.append({'window': None, 'targets': [], 'index': TemplateIndex(), 'overlay': OverlayWindow()})
+        self.monitor_combo.blockSignals(True)
+        self.monitor_combo.addItem("")
+        self.monitor_combo.blockSignals(False)
+        self._update_monitor_title(index)
+
+    def _update_monitor_title(self, index):
+        """刷新下拉框中窗口条目的显示文字。"""
+        window = self.monitors[index]['window']
+        title = window.title if window else "未选择"
+        self.monitor_combo.setItemText(index, f"窗口{index + 1}: {title}")
+
+    def _load_monitor_ui(self, index):
+        """将指定窗口的配置和图片列表显示到界面上。"""
+        monitor_config = self.config_manager.get_monitor(index)
+        monitor = self.monitors[index]
+        self.confidence_slider.setValue(monitor_config['confidence'])
+        self.box_width_input.setText(str(monitor_config['box_width']))
+        self.box_height_input.setText(str(monitor_config['box_height']))
+        self.delay_input.setText(str(monitor_config['disappear_delay']))
+
+        if monitor['window']:
+            self.window_label.setText(f"游戏窗口: {monitor['window'].title}")
+        elif monitor_config['window_title']:
+            self.window_label.setText("游戏窗口: (上次选择的已关闭)")
+        else:
+            self.window_label.setText("游戏窗口: 未选择")
+
+        self.target_list_widget.clear()
+        for path, icon, _ in monitor['targets']:
+            self._add_list_item(path, icon)
+
+    def _save_monitor_ui(self, index):
+        """将界面上的参数保存到指定窗口的配置。"""
+        window = self.monitors[index]['window']
+        self.config_manager.update_monitor(
+            index,
+            confidence=self.confidence_slider.value(),
+            box_width=int(self.box_width_input.text()),
+            box_height=int(self.box_height_input.text()),
+            disappear_delay=float(self.delay_input.text()),
+            window_title=window.title if window else None
+        )
+
+    @pyqtSlot(int)
+    def switch_monitor(self, index):
+        """切换界面正在编辑的监测窗口。"""
+        if index < 0 or index == self.current_monitor:
+            return
+        if self.current_monitor < len(self.monitors):
+            self._save_monitor_ui(self.current_monitor)
+        self.current_monitor = index
+        self._load_monitor_ui(index)
+
+    def add_monitor(self):
+        """新增一个监测窗口并切换到它。"""
+        index = self.config_manager.add_monitor()
+        self._create_monitor(index)
+        self.monitor_combo.setCurrentIndex(index)
+
+    def remove_monitor(self):
+        """移除当前正在编辑的监测窗口。"""
+        if self.is_detection_running:
+            QMessageBox.warning(self, "提示", "请先停止监测再移除窗口。")
+            return
+        if len(self.monitors) <= 1:
+            QMessageBox.warning(self, "提示", "至少需要保留一个监测窗口。")
+            return
+
+        # 单次检测线程按窗口顺序持有覆盖层和截图区域，移除窗口前先停止它
+        self._stop_snapshot_thread()
+        index = self.current_monitor
+        self.monitors.pop(index)['overlay'].close()
+        self.config_manager.remove_monitor(index)
+
+        # 先将当前索引指向不存在的位置，避免切换时把界面内容保存到错误的窗口
+        self.current_monitor = len(self.monitors)
+        self.monitor_combo.blockSignals(True)
+        self.monitor_combo.removeItem(index)
+        self.monitor_combo.blockSignals(False)
+        for i in range(len(self.monitors)):
+            self._update_monitor_title(i)
+        self.switch_monitor(min(index, len(self.monitors) - 1))
+        self.monitor_combo.setCurrentIndex(self.current_monitor)
+        self._schedule_snapshot_rebuild()
 
     def select_window(self):
         """打开窗口选择对话框。"""
@@ -180,19 +344,30 @@ class MainWindow(QMainWindow):
         if dialog.exec():
             title = dialog.selected_window_title
             try:
-                self.selected_window = gw.getWindowsWithTitle(title)[0]
+                self.monitors[self.current_monitor]['window'] = gw.getWindowsWithTitle(title)[0]
                 self.window_label.setText(f"游戏窗口: {title}")
-                self.config_manager.set('window_title', title)
+                self.config_manager.update_monitor(self.current_monitor, window_title=title)
+                self._update_monitor_title(self.current_monitor)
+                self._invalidate_snapshot_thread()
             except IndexError:
                 QMessageBox.warning(self, "错误", f"找不到标题为 '{title}' 的窗口。")
 
-    def add_image_to_list(self, path):
-        """将图片添加到UI列表和数据列表。"""
+    def _add_list_item(self, path, icon):
+        """向界面列表中添加一个图片条目。"""
+        item = QListWidgetItem(icon, os.path.basename(path))
+        item.setData(Qt.ItemDataRole.UserRole, path)
+        self.target_list_widget.addItem(item)
+
+    def add_image_to_list(self, path, monitor_index=None):
+        """将图片添加到指定窗口（默认为当前窗口）的UI列表和数据列表。"""
+        if monitor_index is None:
+            monitor_index = self.current_monitor
+        monitor = self.monitors[monitor_index]
+
         if not os.path.exists(path): return
         
-        for i in range(self.target_list_widget.count()):
-            item = self.target_list_widget.item(i)
-            if item.data(Qt.ItemDataRole.UserRole) == path:
+        for item_path, _, _ in monitor['targets']:
+            if item_path == path:
                 return
 
         # --- THIS IS THE CORRECTED SECTION ---
@@ -217,12 +392,13 @@ class MainWindow(QMainWindow):
             return
         # --- END OF CORRECTION ---
 
-        item = QListWidgetItem(icon, os.path.basename(path))
-        item.setData(Qt.ItemDataRole.UserRole, path)
-        self.target_list_widget.addItem(item)
-        
-        self.config_manager.add_target_image(path)
-        self.target_cv_images.append(img_cv)
+        monitor['targets'].append((path, icon, img_cv))
+        # 将图片加入相似度索引，相似的图片会被聚成一簇，检测时先匹配簇的代表图
+        monitor['index'].add(len(monitor['targets']) - 1, img_cv)
+        self.config_manager.add_target_image(monitor_index, path)
+        if monitor_index == self.current_monitor:
+            self._add_list_item(path, icon)
+        self._invalidate_snapshot_thread()
 
     def add_image_from_dialog(self):
         """通过文件对话框添加图片。"""
@@ -232,13 +408,18 @@ class MainWindow(QMainWindow):
 
     def remove_selected_image(self):
         """移除列表中选中的图片。"""
+        monitor = self.monitors[self.current_monitor]
+        targets = monitor['targets']
         for item in self.target_list_widget.selectedItems():
             path = item.data(Qt.ItemDataRole.UserRole)
             row = self.target_list_widget.row(item)
             self.target_list_widget.takeItem(row)
-            self.config_manager.remove_target_image(path)
-            if row < len(self.target_cv_images):
-                del self.target_cv_images[row]
+            self.config_manager.remove_target_image(self.current_monitor, path)
+            if row < len(targets):
+                del targets[row]
+        # 图片索引随删除而变化，重新构建相似度索引
+        monitor['index'] = TemplateIndex.build([img_cv for _, _, img_cv in targets])
+        self._invalidate_snapshot_thread()
     
     @pyqtSlot()
     def toggle_detection(self):
@@ -247,46 +428,223 @@ class MainWindow(QMainWindow):
             if self.detection_thread:
                 self.detection_thread.stop()
                 self.detection_thread.wait()
-            self.overlay.hide()
-            self.overlay.clear()
+            for overlay in self.active_overlays:
+                overlay.hide()
+                overlay.clear()
+            self.active_overlays = []
             self.is_detection_running = False
             self.toggle_button.setText("启动监测")
+            self._schedule_snapshot_rebuild()
         else:
-            if not self.selected_window or self.selected_window not in gw.getAllWindows():
-                QMessageBox.warning(self, "提示", "请先选择一个有效的游戏窗口！\n（可能已关闭，请重新选择）")
+            if not self._save_settings_checked():
                 return
-            
-            if not self.target_cv_images:
-                QMessageBox.warning(self, "提示", "请至少添加一张待监测的图片！")
+            # 持续监测期间不需要单次检测，释放其线程池
+            self.snapshot_rebuild_timer.stop()
+            self._stop_snapshot_thread()
+
+            monitors, overlays, _ = self._collect_detection_monitors()
+            if monitors is None:
                 return
-            
-            self.save_settings()
-            
-            rect = {
-                'left': self.selected_window.left, 
-                'top': self.selected_window.top, 
-                'width': self.selected_window.width, 
-                'height': self.selected_window.height
-            }
-            box_dims = {'width': int(self.box_width_input.text()), 'height': int(self.box_height_input.text())}
-
-            self.detection_thread = DetectionThread(
-                window_rect=rect,
-                targets_cv=self.target_cv_images,
-                confidence=self.confidence_slider.value(),
-                box_dims=box_dims,
-                delay=float(self.delay_input.text())
-            )
-            self.detection_thread.detection_signal.connect(self.overlay.update_rects)
+
+            self.active_overlays = overlays
+            self.detection_thread = self._create_detection_thread(monitors, controller=self.create_latency_controller())
+            self.detection_thread.detection_signal.connect(self.on_detection)
             self.detection_thread.error_signal.connect(self.on_detection_error)
             
-            self.overlay.setGeometry(rect['left'], rect['top'], rect['width'], rect['height'])
-            self.overlay.show()
+            for overlay in self.active_overlays:
+                overlay.show()
             self.detection_thread.start()
             
             self.is_detection_running = True
             self.toggle_button.setText("停止监测")
 
+    def _collect_detection_monitors(self, warn=True):
+        """
+        收集所有已选择有效窗口且添加了图片的监测窗口，生成检测线程所需的参数。
+        :param warn: 没有可用窗口时是否弹窗提示（后台重建单次检测线程时不提示）
+        :return: (检测参数列表, 对应的覆盖层列表, 各窗口的 (窗口对象, 截图区域))；没有可用窗口时返回 (None, None, None)
+        """
+        all_windows = gw.getAllWindows()
+        active = [(index, monitor) for index, monitor in enumerate(self.monitors)
+                  if monitor['window'] and monitor['window'] in all_windows and monitor['targets']]
+        if not active:
+            if not warn:
+                return None, None, None
+            QMessageBox.warning(self, "提示", "请至少为一个监测窗口选择有效的游戏窗口并添加待监测图片！\n（窗口可能已关闭，请重新选择）")
+            return None, None, None
+
+        monitors = []
+        overlays = []
+        geometry = []
+        for index, monitor in active:
+            window = monitor['window']
+            monitor_config = self.config_manager.get_monitor(index)
+            rect = {
+                'left': window.left, 
+                'top': window.top, 
+                'width': window.width, 
+                'height': window.height
+            }
+            monitors.append({
+                'window_rect': rect,
+                'targets_cv': [img_cv for _, _, img_cv in monitor['targets']],
+                'confidence': monitor_config['confidence'],
+                'box_dims': {'width': monitor_config['box_width'], 'height': monitor_config['box_height']},
+                'delay': monitor_config['disappear_delay'],
+                # 此处只引用界面线程的索引，真正创建检测线程时才复制（见 _create_detection_thread）
+                'index': monitor['index'],
+                'capacity': self.config_manager.get('max_matches_per_template')
+            })
+            geometry.append((window, self._window_rect(window)))
+
+            overlay = monitor['overlay']
+            overlay.setGeometry(rect['left'], rect['top'], rect['width'], rect['height'])
+            overlays.append(overlay)
+
+        return monitors, overlays, geometry
+
+    @staticmethod
+    def _window_rect(window):
+        """窗口当前的位置和尺寸。"""
+        return window.left, window.top, window.width, window.height
+
+    def _save_settings_checked(self, warn=True):
+        """保存界面参数；输入的数值格式错误时返回 False，warn 为 True 时同时提示用户。"""
+        try:
+            self.save_settings()
+        except ValueError:
+            if not warn:
+                return False
+            QMessageBox.warning(self, "提示", "参数格式错误，请在红框尺寸、消失延迟等输入框中填写有效的数字。")
+            return False
+        return True
+
+    def _snapshot_thread_valid(self):
+        """单次检测线程是否可以直接复用：线程存在，且各窗口的位置和尺寸没有变化。"""
+        if self.snapshot_thread is None:
+            return False
+        try:
+            return all(self._window_rect(window) == rect for window, rect in self.snapshot_geometry)
+        except Exception:
+            # 窗口已关闭等情况，交给重建流程处理
+            return False
+
+    def _invalidate_snapshot_thread(self, *_):
+        """检测参数、图片或窗口发生变化时丢弃单次检测线程，并在后台按新参数重建。"""
+        if self.snapshot_thread is not None:
+            self._stop_snapshot_thread()
+        self._schedule_snapshot_rebuild()
+
+    def _schedule_snapshot_rebuild(self):
+        """稍后在后台重建单次检测线程（持续监测期间不需要）。"""
+        if not self.is_detection_running:
+            self.snapshot_rebuild_timer.start()
+
+    def _rebuild_snapshot_thread(self, warn=False):
+        """
+        按当前参数创建并启动单次检测线程，线程启动后先预热一次再等待按键。
+        后台重建时（warn 为 False）参数无效或没有可用窗口则静默跳过，等下次参数变化或按键时再试。
+        :return: 是否已有可用的单次检测线程
+        """
+        self.snapshot_rebuild_timer.stop()
+        if self.is_detection_running:
+            return False
+        self._stop_snapshot_thread()
+        if not self._save_settings_checked(warn):
+            return False
+        monitors, overlays, geometry = self._collect_detection_monitors(warn)
+        if monitors is None:
+            return False
+
+        self.snapshot_thread = self._create_detection_thread(monitors, single_shot=True)
+        self.snapshot_thread.detection_signal.connect(self.on_snapshot_detection)
+        self.snapshot_thread.shot_signal.connect(self.on_snapshot_done)
+        self.snapshot_thread.error_signal.connect(self.on_snapshot_error)
+        self.snapshot_overlays = overlays
+        self.snapshot_geometry = geometry
+        for overlay in self.snapshot_overlays:
+            overlay.show()
+        self.snapshot_thread.start()
+        return True
+
+    def _create_detection_thread(self, monitors, **kwargs):
+        """
+        创建检测线程。只在此时复制各窗口的相似度索引，避免界面线程之后的修改影响检测线程；
+        单次检测在参数未变化时复用已有线程，不会重复复制。
+        """
+        for monitor in monitors:
+            monitor['index'] = monitor['index'].snapshot()
+        return DetectionThread(monitors, **kwargs)
+
+    @pyqtSlot(float)
+    def trigger_single_shot(self, press_time):
+        """
+        单次检测：在预热好的管线上截图并匹配一次，红框显示 disappear_delay 秒（至少 DetectionThread.SHOT_MIN_DISPLAY 秒）。
+        检测线程在参数变化后即在后台重建并预热（见 _invalidate_snapshot_thread），两次请求之间阻塞等待，不占用CPU；
+        按键时只检查窗口位置是否变化。只有窗口移动过或后台重建失败时才在按键时重建，
+        此时线程的预热时间不计入报告的按键延迟（见 DetectionThread._run_single_shot）。
+        """
+        if self.is_detection_running:
+            # 持续监测中红框已实时显示
+            return
+
+        if not self._snapshot_thread_valid() and not self._rebuild_snapshot_thread(warn=True):
+            return
+        self.snapshot_thread.request_shot(press_time)
+
+    def _stop_snapshot_thread(self):
+        """停止单次检测线程并清除其红框。"""
+        if self.snapshot_thread:
+            self.snapshot_thread.stop()
+            self.snapshot_thread.wait()
+            self.snapshot_thread = None
+        for overlay in self.snapshot_overlays:
+            overlay.hide()
+            overlay.clear()
+        self.snapshot_overlays = []
+        self.snapshot_geometry = []
+
+    @pyqtSlot(int, list)
+    def on_snapshot_detection(self, window_index, rects):
+        """将单次检测结果转发给对应窗口的覆盖层。"""
+        if window_index < len(self.snapshot_overlays):
+            self.snapshot_overlays[window_index].update_rects(rects)
+
+    @pyqtSlot(float)
+    def on_snapshot_done(self, press_time):
+        """单次检测完成：立即重绘红框，并报告从按下热键到红框显示的延迟。"""
+        for overlay in self.snapshot_overlays:
+            overlay.repaint()
+        latency_ms = (time.perf_counter() - press_time) * 1000
+        self.statusBar().showMessage(f"单次检测完成，按键到显示延迟: {latency_ms:.1f} ms")
+        logger.info("单次检测按键到显示延迟: %.1f ms", latency_ms)
+
+    @pyqtSlot(str)
+    def on_snapshot_error(self, message):
+        """处理单次检测线程中的错误。"""
+        QMessageBox.critical(self, "检测错误", message)
+        self._stop_snapshot_thread()
+
+    def create_latency_controller(self):
+        """根据配置创建自适应调节控制器，目标延迟为0时返回 None（关闭自动调节）。"""
+        config = self.config_manager.config
+        if config['target_latency_ms'] <= 0:
+            return None
+        return LatencyController(
+            target_latency_ms=config['target_latency_ms'],
+            cpu_budget=config['cpu_budget'],
+            max_workers=config['max_workers'] or max(1, multiprocessing.cpu_count() - 1),
+            min_fps=config['min_fps'],
+            max_fps=config['max_fps'],
+            max_level=config['max_pyramid_level']
+        )
+
+    @pyqtSlot(int, list)
+    def on_detection(self, window_index, rects):
+        """将检测结果转发给对应窗口的覆盖层。"""
+        if window_index < len(self.active_overlays):
+            self.active_overlays[window_index].update_rects(rects)
+
     @pyqtSlot(str)
     def on_detection_error(self, message):
         """处理检测线程中的错误。"""
@@ -300,8 +658,10 @@ class MainWindow(QMainWindow):
             self.hotkey_listener.wait()
 
         hotkey = self.hotkey_input.text()
-        self.hotkey_listener = HotkeyListener(hotkey)
+        snapshot_hotkey = self.snapshot_hotkey_input.text()
+        self.hotkey_listener = HotkeyListener(hotkey, snapshot_hotkey)
         self.hotkey_listener.hotkey_pressed.connect(self.toggle_detection)
+        self.hotkey_listener.snapshot_pressed.connect(self.trigger_single_shot)
         self.hotkey_listener.start()
 
     def dragEnterEvent(self, event):
@@ -321,17 +681,22 @@ class MainWindow(QMainWindow):
         if self.detection_thread and self.detection_thread.isRunning():
             self.detection_thread.stop()
             self.detection_thread.wait()
+
+        self.snapshot_rebuild_timer.stop()
+        self._stop_snapshot_thread()
         
         if self.hotkey_listener:
             self.hotkey_listener.stop()
             self.hotkey_listener.wait()
             
-        self.overlay.close()
+        for monitor in self.monitors:
+            monitor['overlay'].close()
         event.accept()
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(name)s] %(message)s")
+
     # 确保在Windows上使用 'spawn' 启动方式以避免多进程问题
-    import multiprocessing
     multiprocessing.freeze_support()
     if sys.platform.startswith('win'):
         multiprocessing.set_start_method('spawn', force=True)
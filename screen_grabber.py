@@ -0,0 +1,135 @@
+# screen_grabber.py
+
+import sys
+import ctypes
+import numpy as np
+import mss
+
+class GdiGrabber:
+    """
+    Windows 下的截图器：用 BitBlt 把屏幕区域直接复制到常驻的 DIB section 中。
+    每种截图尺寸只在首次使用时创建一次 DIB section，并用 numpy 视图包装其像素内存，
+    之后每帧都写入同一块内存，不再产生新的画面大小的缓冲区。
+    只能在创建它的线程中使用。
+    """
+
+    SRCCOPY = 0x00CC0020
+    CAPTUREBLT = 0x40000000
+
+    def __init__(self):
+        from ctypes import wintypes
+
+        class BITMAPINFOHEADER(ctypes.Structure):
+            _fields_ = [
+                ('biSize', wintypes.DWORD), ('biWidth', wintypes.LONG), ('biHeight', wintypes.LONG),
+                ('biPlanes', wintypes.WORD), ('biBitCount', wintypes.WORD), ('biCompression', wintypes.DWORD),
+                ('biSizeImage', wintypes.DWORD), ('biXPelsPerMeter', wintypes.LONG),
+                ('biYPelsPerMeter', wintypes.LONG), ('biClrUsed', wintypes.DWORD), ('biClrImportant', wintypes.DWORD),
+            ]
+
+        class BITMAPINFO(ctypes.Structure):
+            _fields_ = [('bmiHeader', BITMAPINFOHEADER), ('bmiColors', wintypes.DWORD * 3)]
+
+        self._BITMAPINFO = BITMAPINFO
+        self.user32 = ctypes.WinDLL('user32')
+        self.gdi32 = ctypes.WinDLL('gdi32')
+        # 句柄在 64 位系统上是指针大小，必须声明参数和返回类型，否则会被截断为 int
+        self.user32.GetWindowDC.argtypes = [wintypes.HWND]
+        self.user32.GetWindowDC.restype = wintypes.HDC
+        self.user32.ReleaseDC.argtypes = [wintypes.HWND, wintypes.HDC]
+        self.gdi32.CreateCompatibleDC.argtypes = [wintypes.HDC]
+        self.gdi32.CreateCompatibleDC.restype = wintypes.HDC
+        self.gdi32.CreateDIBSection.argtypes = [wintypes.HDC, ctypes.POINTER(BITMAPINFO), wintypes.UINT,
+                                                ctypes.POINTER(ctypes.c_void_p), wintypes.HANDLE, wintypes.DWORD]
+        self.gdi32.CreateDIBSection.restype = wintypes.HBITMAP
+        self.gdi32.SelectObject.argtypes = [wintypes.HDC, wintypes.HGDIOBJ]
+        self.gdi32.SelectObject.restype = wintypes.HGDIOBJ
+        self.gdi32.BitBlt.argtypes = [wintypes.HDC, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                      wintypes.HDC, ctypes.c_int, ctypes.c_int, wintypes.DWORD]
+        self.gdi32.BitBlt.restype = wintypes.BOOL
+        self.gdi32.DeleteObject.argtypes = [wintypes.HGDIOBJ]
+        self.gdi32.DeleteDC.argtypes = [wintypes.HDC]
+
+        # 与 mss 一致：声明 DPI 感知，使截图坐标与窗口的物理像素坐标一致
+        try:
+            ctypes.WinDLL('shcore').SetProcessDpiAwareness(2)
+        except Exception:
+            self.user32.SetProcessDPIAware()
+
+        self.srcdc = self.user32.GetWindowDC(None)
+        self.memdc = self.gdi32.CreateCompatibleDC(self.srcdc)
+        self._sections = {}  # {(宽, 高): (DIB 句柄, numpy 视图)}
+        self._selected = None
+
+    def _section(self, width, height):
+        """获取指定尺寸的 DIB section，不存在时创建。"""
+        section = self._sections.get((width, height))
+        if section is not None:
+            return section
+
+        bmi = self._BITMAPINFO()
+        bmi.bmiHeader.biSize = ctypes.sizeof(bmi.bmiHeader)
+        bmi.bmiHeader.biWidth = width
+        bmi.bmiHeader.biHeight = -height  # 负数表示自上而下的行顺序，与 numpy 的行顺序一致
+        bmi.bmiHeader.biPlanes = 1
+        bmi.bmiHeader.biBitCount = 32
+        bits = ctypes.c_void_p()
+        dib = self.gdi32.CreateDIBSection(self.memdc, ctypes.byref(bmi), 0, ctypes.byref(bits), None, 0)
+        if not dib:
+            raise OSError(f"CreateDIBSection 失败 ({width}x{height})")
+        buffer = (ctypes.c_ubyte * (width * height * 4)).from_address(bits.value)
+        section = (dib, np.ctypeslib.as_array(buffer).reshape(height, width, 4))
+        self._sections[(width, height)] = section
+        return section
+
+    def grab(self, region):
+        """截取 region 区域，返回 BGRA 画面（复用的缓冲区，下次截取同尺寸区域时会被覆盖）。"""
+        width, height = region['width'], region['height']
+        dib, frame = self._section(width, height)
+        if self._selected != dib:
+            self.gdi32.SelectObject(self.memdc, dib)
+            self._selected = dib
+        if not self.gdi32.BitBlt(self.memdc, 0, 0, width, height, self.srcdc,
+                                 region['left'], region['top'], self.SRCCOPY | self.CAPTUREBLT):
+            raise OSError("BitBlt 截图失败")
+        # 确保 GDI 已完成写入再读取 DIB 内存
+        self.gdi32.GdiFlush()
+        return frame
+
+    def close(self):
+        """释放 GDI 资源。"""
+        for dib, _ in self._sections.values():
+            self.gdi32.DeleteObject(dib)
+        self._sections = {}
+        if self.memdc:
+            self.gdi32.DeleteDC(self.memdc)
+            self.memdc = None
+        if self.srcdc:
+            self.user32.ReleaseDC(None, self.srcdc)
+            self.srcdc = None
+
+
+class MssGrabber:
+    """
+    其他平台使用 mss 截图。mss 每次截图都会新建一块画面大小的 bytearray，
+    这里只用 numpy 视图包装、避免再复制一次，这一次分配无法消除。
+    """
+
+    def __init__(self, sct=None):
+        """:param sct: 可选的 mss 实例（或具有相同 grab 接口的对象），默认新建"""
+        self.sct = sct if sct is not None else mss.mss()
+
+    def grab(self, region):
+        """截取 region 区域，返回 BGRA 画面。"""
+        screenshot = self.sct.grab(region)
+        return np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(screenshot.height, screenshot.width, 4)
+
+    def close(self):
+        self.sct.close()
+
+
+def create_grabber():
+    """创建当前平台的截图器（Windows 使用复用缓冲区的 GDI 截图，其他平台使用 mss）。"""
+    if sys.platform.startswith('win'):
+        return GdiGrabber()
+    return MssGrabber()
@@ -0,0 +1,180 @@
+# template_index.py
+
+import copy
+import cv2
+import numpy as np
+
+class TemplateNode:
+    """索引树中的一个节点：叶子对应一张目标图片，内部节点代表一簇相似图片。"""
+
+    def __init__(self, template, template_index=None):
+        self.template = template              # 叶子为原图，内部节点为簇内所有图片的平均图
+        self.template_index = template_index  # 叶子对应的目标图片索引，内部节点为 None
+        self.children = []
+        self.sum = template.astype(np.float64)
+        self.count = 1
+        self._spread = None
+
+    @property
+    def spread(self):
+        """代表图与簇内各图片相似度的最小值（叶子为 1），簇内图片越分散越低。"""
+        if self.is_leaf:
+            return 1.0
+        if self._spread is None:
+            self._spread = min(TemplateIndex.similarity(self.template, leaf.template) for leaf in self.leaves())
+        return self._spread
+
+    def leaves(self):
+        """本节点下的所有叶子。"""
+        if self.is_leaf:
+            return [self]
+        return [leaf for child in self.children for leaf in child.leaves()]
+
+    @property
+    def is_leaf(self):
+        return self.template_index is not None
+
+    def add_member(self, leaf):
+        """将一张图片计入本簇，并更新平均图。"""
+        self.sum += leaf.template
+        self.count += 1
+        self._update_template()
+
+    def _update_template(self):
+        self.template = np.clip(np.round(self.sum / self.count), 0, 255).astype(np.uint8)
+        self._spread = None
+
+
+class TemplateIndex:
+    """
+    目标图片的相似度索引。
+    同尺寸且相似的图片（例如同一张卡片的不同边框版本）被聚成一簇，以平均图作为代表，
+    簇内再按更严格的相似度递归细分，形成一棵树；顶层先按更宽松的相似度聚类，
+    使大致相似的簇再合并到同一个代表图之下。检测时只需在整幅画面上匹配顶层代表图，
+    只有代表图在某处得分超过该簇放宽后的阈值，才在该位置附近逐层匹配簇内成员。
+    整幅画面的匹配次数取决于彼此不相似的图片组数量，而不是图片总数：
+    同一组图片的变体再多也只增加局部细化的成本，但互不相似的图片各自仍需一次整幅画面匹配。
+    """
+
+    # 深度 0 的聚类相似度阈值（归一化相关系数），每深入一层与 1 的差距减半，每往上一层加倍
+    SIMILARITY = 0.8
+    # 深度 0 之上还有几层更宽松的聚类（1 层即相似度 0.6）
+    LOOSE_LEVELS = 1
+    # 单个簇的直接子节点数上限，超过时一分为二，保证树的深度随图片数量按对数增长
+    MAX_CHILDREN = 8
+    # 簇的放宽阈值在估计值之外再降低多少，容忍截图噪声
+    RELAXED_MARGIN = 0.05
+
+    def __init__(self):
+        self.roots = {}  # {(高, 宽): [顶层节点, ...]}
+
+    @classmethod
+    def build(cls, templates):
+        """根据图片列表重新构建索引（例如删除图片之后）。"""
+        index = cls()
+        for template_index, template in enumerate(templates):
+            index.add(template_index, template)
+        return index
+
+    def snapshot(self):
+        """
+        复制一份索引供检测线程使用，避免界面线程同时修改。
+        复制前先算好各簇的分散程度（spread），检测时不必再计算。
+        """
+        for node in self.root_nodes():
+            self._compute_spread(node)
+        return copy.deepcopy(self)
+
+    def _compute_spread(self, node):
+        """自下而上计算 node 及其所有子簇的 spread（读取属性即会计算并缓存）。"""
+        for child in node.children:
+            self._compute_spread(child)
+        _ = node.spread
+
+    def root_nodes(self):
+        """所有尺寸的顶层节点，即需要在整幅画面上匹配的模板。"""
+        return [node for nodes in self.roots.values() for node in nodes]
+
+    def add(self, template_index, template):
+        """将一张图片插入索引。"""
+        if template is None:
+            return
+        leaf = TemplateNode(template, template_index)
+        self._insert(self.roots.setdefault(template.shape, []), leaf, -self.LOOSE_LEVELS)
+
+    def _threshold(self, depth):
+        """第 depth 层的聚类相似度阈值（depth 为负时即深度 0 之上的宽松层）。"""
+        return 1.0 - (1.0 - self.SIMILARITY) / (2.0 ** depth)
+
+    @classmethod
+    def relaxed_threshold(cls, node, confidence):
+        """
+        簇的代表图使用的阈值。
+        画面某处与簇内图片的相似度为 confidence、该图片与代表图的相似度为 spread 时，
+        该处与代表图的相似度约为二者之积，因此簇内图片越分散，阈值越低。
+        """
+        if node.is_leaf:
+            return confidence
+        return confidence * node.spread - cls.RELAXED_MARGIN
+
+    @staticmethod
+    def similarity(template_a, template_b):
+        """两张同尺寸图片的归一化相关系数。"""
+        return float(cv2.matchTemplate(template_a, template_b, cv2.TM_CCOEFF_NORMED)[0, 0])
+
+    def _insert(self, nodes, leaf, depth):
+        """将叶子插入 nodes 所在的层：加入最相似的簇，或与最相似的叶子组成新簇，否则单独成为一个节点。"""
+        best, best_similarity = None, -1.0
+        for node in nodes:
+            similarity = self.similarity(node.template, leaf.template)
+            if similarity > best_similarity:
+                best, best_similarity = node, similarity
+
+        if best is None or best_similarity < self._threshold(depth):
+            nodes.append(leaf)
+            return
+
+        if best.is_leaf:
+            nodes[nodes.index(best)] = self._make_cluster([best, leaf])
+            return
+
+        best.add_member(leaf)
+        self._insert(best.children, leaf, depth + 1)
+        if len(best.children) > self.MAX_CHILDREN:
+            self._split(best)
+
+    def _make_cluster(self, children):
+        """用若干子节点组成一个新簇。"""
+        cluster = TemplateNode(children[0].template)
+        cluster.sum = sum(child.sum for child in children)
+        cluster.count = sum(child.count for child in children)
+        cluster._update_template()
+        cluster.children = list(children)
+        return cluster
+
+    def _split(self, cluster):
+        """
+        子节点过多时，以彼此最不相似的两个子节点为种子，
+        将其余子节点分到更相似的一边，形成两个子簇。
+        """
+        children = cluster.children
+        seed_a, seed_b, lowest = children[0], children[1], 2.0
+        for i, child_a in enumerate(children):
+            for child_b in children[i + 1:]:
+                similarity = self.similarity(child_a.template, child_b.template)
+                if similarity < lowest:
+                    seed_a, seed_b, lowest = child_a, child_b, similarity
+
+        group_a, group_b = [seed_a], [seed_b]
+        for child in children:
+            if child is seed_a or child is seed_b:
+                continue
+            if self.similarity(child.template, seed_a.template) >= self.similarity(child.template, seed_b.template):
+                group_a.append(child)
+            else:
+                group_b.append(child)
+
+        cluster.children = [
+            group[0] if len(group) == 1 else self._make_cluster(group)
+            for group in (group_a, group_b)
+        ]